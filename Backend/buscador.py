@@ -0,0 +1,352 @@
+"""
+Búsqueda de productos por nombre para /buscar-productos.
+- Mismo universo que el ILIKE original: todo producto con precio > 0,
+  también los tipos que el optimizador no usa (solo_catalogo=True se queda
+  con los del catálogo del optimizador)
+- Índice de trigramas en memoria, rehecho con cada versión del catálogo
+  (CSR: trigrama -> fila en int32), con nombres plegados: sin tildes, en
+  minúsculas ("platano" encuentra "Plátano")
+- La última palabra de la consulta cuenta como prefijo (se busca mientras
+  se escribe) y se toleran erratas: basta con BUSCAR_COBERTURA_MIN de los
+  trigramas de la consulta. Todo nombre que contiene la consulta (también a
+  media palabra: "tano" → "Plátano") entra siempre, como con el ILIKE
+- Relevancia: nombre que empieza por la consulta > alguna palabra empieza
+  por ella > la contiene > parecido; a igualdad, el nombre más corto
+- Macros por pack: ya están en la TablaProductos, no se calcula nada
+- Hasta que el índice está listo (worker recién arrancado, o el catálogo
+  aún cargando en segundo plano) se consulta Postgres con un LIKE sobre el
+  nombre plegado, acelerado por un índice GIN de pg_trgm si existe. El
+  índice lo crea preparar_indice_bbdd desde _init_db (arranque), nunca una
+  petición: la API solo consulta
+"""
+import threading
+import time
+import unicodedata
+from array import array
+
+import numpy as np
+from sqlalchemy import text
+
+from catalogo import SECCIONES, TIPOS_FUERA, cargar_productos, version_catalogo
+
+BUSCAR_LIMITE = 20
+BUSCAR_COBERTURA_MIN = 0.6  # fracción de trigramas de la consulta que debe tener el nombre
+BUSCAR_CANDIDATOS = 3  # × límite: candidatos que pasan al orden fino
+_INICIO = "^"  # relleno de los trigramas de la primera palabra (marca "el nombre empieza por")
+
+# Plegado en Postgres (translate es IMMUTABLE: se puede indexar; unaccent no)
+_CON_TILDE = "áàâäãéèêëíìîïóòôöõúùûüñç"
+_SIN_TILDE = "aaaaaeeeeiiiiooooouuuunc"
+SQL_PLEGAR = f"translate(lower(p.nombre), '{_CON_TILDE}', '{_SIN_TILDE}')"
+
+# CONCURRENTLY: no bloquea las escrituras en productos_v2 mientras se construye,
+# pero no puede ir dentro de una transacción (cada sentencia en autocommit)
+SQL_EXTENSION_TRGM = "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+SQL_INDICE_TRGM = f"""
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_productos_nombre_trgm
+        ON productos_v2 USING gin ((translate(lower(nombre), '{_CON_TILDE}', '{_SIN_TILDE}')) gin_trgm_ops)
+"""
+# Un CONCURRENTLY que falla a medias deja el índice INVALID y IF NOT EXISTS ya no lo rehace
+SQL_TRGM_INVALIDO = """
+    SELECT 1 FROM pg_index WHERE indexrelid = to_regclass('idx_productos_nombre_trgm') AND NOT indisvalid
+"""
+
+
+def _sql_buscar(filtro_tipos=""):
+    """Mismo universo que QUERY_BUSQUEDA (precio > 0), o el del catálogo con filtro_tipos."""
+    return f"""
+    SELECT nombre, precio, tipo, emoji, imagen_url, momentos,
+           proteinas_100g, carbohidratos_100g, grasas_100g, calorias_100g, peso_gramos
+    FROM (
+        SELECT DISTINCT ON (p.nombre)
+            p.nombre, p.precio, p.peso_gramos, p.imagen_url, c.tipo, c.emoji, p.momentos,
+            n.proteinas_100g, n.carbohidratos_100g, n.grasas_100g, n.calorias_100g,
+            {SQL_PLEGAR} AS plegado
+        FROM productos_v2 p
+        JOIN categorias c ON p.categoria_id = c.id
+        JOIN nutricion n ON n.producto_id = p.id
+        WHERE p.precio > 0 {filtro_tipos}
+          AND {SQL_PLEGAR} LIKE :contiene
+        ORDER BY p.nombre, p.precio ASC
+    ) t
+    ORDER BY (plegado LIKE :empieza) DESC, (plegado LIKE :palabra) DESC, length(nombre), nombre
+    LIMIT :limite
+"""
+
+
+SQL_BUSCAR = _sql_buscar()
+# solo_catalogo: lo que puede usar el optimizador (QUERY_PRODUCTOS)
+SQL_BUSCAR_CATALOGO = _sql_buscar("AND c.tipo NOT IN (" + ", ".join(f"'{t}'" for t in TIPOS_FUERA) + ")")
+
+
+def preparar_indice_bbdd(engine):
+    """
+    Índice GIN de pg_trgm para el respaldo en Postgres (DDL: hace falta un rol
+    con permisos). Sin la extensión o sin permisos el LIKE hará un scan.
+    """
+    try:
+        with engine.execution_options(isolation_level="AUTOCOMMIT").connect() as conn:
+            conn.execute(text(SQL_EXTENSION_TRGM))
+            if conn.execute(text(SQL_TRGM_INVALIDO)).first():
+                conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS idx_productos_nombre_trgm"))
+            conn.execute(text(SQL_INDICE_TRGM))
+        print("[BUSCAR] Índice pg_trgm de productos_v2 listo")
+    except Exception as e:
+        print(f"[BUSCAR] Sin índice pg_trgm ({e.__class__.__name__}): el respaldo hará un scan")
+
+
+def plegar(texto):
+    """Minúsculas, sin tildes ni diéresis y con los espacios normalizados."""
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return " ".join("".join(ch for ch in descompuesto if not unicodedata.combining(ch)).split())
+
+
+def _palabras(plegado):
+    return "".join(ch if ch.isalnum() else " " for ch in plegado).split()
+
+
+def trigramas(plegado, prefijo=False):
+    """
+    Trigramas por palabra al estilo pg_trgm ("  pl", " pla"... "no "), más
+    los de inicio de nombre ("^^p", "^pl") para la primera palabra.
+    prefijo: la última palabra puede estar a medio escribir (sin relleno final).
+    """
+    palabras = _palabras(plegado)
+    tris = []
+    for k, palabra in enumerate(palabras):
+        fin = "" if prefijo and k == len(palabras) - 1 else " "
+        relleno = f"  {palabra}{fin}"
+        tris += [relleno[i:i + 3] for i in range(len(relleno) - 2)]
+        if k == 0:
+            tris += [f"{_INICIO}{_INICIO}{palabra[0]}", f"{_INICIO}{palabra[:2]}"][:len(palabra)]
+    return list(dict.fromkeys(tris))
+
+
+class IndiceBusqueda:
+    """Índice de trigramas de una VistaProductos (inmutable; se rehace con cada versión de catálogo)."""
+
+    def __init__(self, productos, version=None):
+        t0 = time.perf_counter()
+        self.version = version
+        self.productos = productos
+        tabla = productos.tabla
+        self.plegados = [plegar(tabla.nombres[s]) for s in productos.sid.tolist()]
+        fuera = [k for k, tipo in enumerate(tabla.tipos) if tipo in TIPOS_FUERA]
+        self.en_catalogo = ~np.isin(tabla.tipo[productos.sid], fuera)
+
+        # Todos los nombres en un solo texto UTF-8 (plegar no deja "\n") para el
+        # "contiene" vectorizado; _offsets = byte donde empieza cada nombre
+        self._texto = np.frombuffer("\n".join(self.plegados).encode(), np.uint8)
+        self._offsets = np.cumsum([0] + [len(p.encode()) + 1 for p in self.plegados[:-1]], dtype=np.int64)
+
+        ids, filas = {}, (array('i'), array('i'))  # (trigrama, fila) por cada aparición
+        self.n_trigramas = np.zeros(len(self.plegados), np.int32)
+        for fila, plegado in enumerate(self.plegados):
+            tris = trigramas(plegado)
+            self.n_trigramas[fila] = len(tris)
+            for tri in tris:
+                filas[0].append(ids.setdefault(tri, len(ids)))
+                filas[1].append(fila)
+        codigo, fila = np.array(filas[0], np.int32), np.array(filas[1], np.int32)
+        orden = np.argsort(codigo, kind='stable')
+        self._ids = ids
+        self._postings = fila[orden]
+        self._inicio = np.searchsorted(codigo[orden], np.arange(len(ids) + 1)).astype(np.int64)
+        self.largo = np.fromiter((len(p) for p in self.plegados), np.int32, len(self.plegados))
+        self.segundos = time.perf_counter() - t0
+
+    def _filas(self, tri):
+        k = self._ids.get(tri)
+        return self._postings[self._inicio[k]:self._inicio[k + 1]] if k is not None else None
+
+    def _contienen(self, consulta):
+        """
+        Filas cuyo nombre plegado contiene la consulta en cualquier posición
+        (el ILIKE '%q%'). Un nombre que la contiene tiene todos sus trigramas
+        interiores (3 letras seguidas de una palabra): se comprueba solo la
+        lista del más raro. Si no tiene ninguno ("de", "pa"), búsqueda por
+        bytes en todos los nombres: posiciones del primer byte, descartando
+        las que no siguen con el resto (en UTF-8 es lo mismo que por caracteres).
+        """
+        interiores = [p[i:i + 3] for p in _palabras(consulta) for i in range(len(p) - 2)]
+        if interiores:
+            listas = [self._filas(t) for t in interiores]
+            if any(f is None for f in listas):
+                return np.empty(0, np.int64)
+            filas = min(listas, key=len).tolist()
+            return np.array([f for f in filas if consulta in self.plegados[f]], np.int64)
+
+        patron, texto = np.frombuffer(consulta.encode(), np.uint8), self._texto
+        if len(patron) > len(texto):
+            return np.empty(0, np.int64)
+        posiciones = np.flatnonzero(texto[:len(texto) - len(patron) + 1] == patron[0])
+        for k in range(1, len(patron)):
+            posiciones = posiciones[texto[posiciones + k] == patron[k]]
+        return np.searchsorted(self._offsets, posiciones, side='right') - 1
+
+    def buscar(self, q, limite=BUSCAR_LIMITE, solo_catalogo=False):
+        """Filas de la vista (índices) ordenadas por relevancia."""
+        consulta = plegar(q)
+        if not consulta or not self.plegados:
+            return []
+        n = len(self.plegados)
+        contiene = np.zeros(n, bool)
+        contiene[self._contienen(consulta)] = True
+
+        tris = trigramas(consulta, prefijo=True)
+        inicio = [t for t in tris if t.startswith(_INICIO)]
+        normales = [t for t in tris if not t.startswith(_INICIO)]
+        listas = [f for f in map(self._filas, normales) if f is not None]
+        cobertura = np.zeros(n)
+        if listas:
+            cobertura = np.bincount(np.concatenate(listas), minlength=n) / len(normales)
+        candidatas = np.flatnonzero((cobertura >= BUSCAR_COBERTURA_MIN) | contiene)
+        if solo_catalogo:
+            candidatas = candidatas[self.en_catalogo[candidatas]]
+        if not len(candidatas):
+            return []
+
+        # Orden grueso vectorizado: contiene la consulta, cobertura, empieza como
+        # la consulta, nombre corto (los que la contienen nunca se quedan fuera
+        # del orden fino por un parecido con erratas)
+        empieza = np.zeros(n, np.int32)
+        for f in map(self._filas, inicio):
+            if f is not None:
+                empieza[f] += 1
+        nota = 1.0 * contiene[candidatas] + cobertura[candidatas] \
+            + 0.5 * (empieza[candidatas] == len(inicio)) - 1e-4 * self.largo[candidatas]
+        cuantas = limite * BUSCAR_CANDIDATOS
+        if len(candidatas) > cuantas:
+            mejores = np.argpartition(-nota, cuantas)[:cuantas]
+            candidatas, nota = candidatas[mejores], nota[mejores]
+
+        # Orden fino sobre el texto plegado de los pocos que quedan
+        def clave(fila, nota_fila):
+            nombre = self.plegados[fila]
+            if nombre.startswith(consulta):
+                nivel = 0
+            elif f" {consulta}" in f" {nombre}":
+                nivel = 1
+            elif consulta in nombre:
+                nivel = 2
+            else:
+                nivel = 3
+            return nivel, -nota_fila, nombre, fila
+        claves = map(clave, candidatas.tolist(), nota.tolist())
+        return [c[-1] for c in sorted(claves)[:limite]]
+
+    def resultados(self, filas):
+        """Lo que devuelve /buscar-productos para esas filas (macros por pack ya calculadas)."""
+        t = self.productos.tabla
+        sid = self.productos.sid[filas]
+        columnas = zip(sid.tolist(), t.precio[sid].tolist(), t.tipo[sid].tolist(), t.emoji[sid].tolist(),
+                       t.secciones[sid].tolist(), t.prot_pack[sid].tolist(), t.kcal_pack[sid].tolist(),
+                       t.carb_pack[sid].tolist(), t.gras_pack[sid].tolist())
+        return [{
+            "nombre": t.nombres[i],
+            "precio": round(precio, 2),
+            "tipo": t.tipos[tipo],
+            "emoji": t.emojis[emoji] or "",
+            "imagen_url": t.imagenes[i] or "",
+            "momentos": [s for j, s in enumerate(SECCIONES) if bits >> j & 1],
+            "prot_pack": round(prot, 1),
+            "kcal_pack": round(kcal, 0),
+            "carb_pack": round(carb, 1),
+            "gras_pack": round(gras, 1),
+        } for i, precio, tipo, emoji, bits, prot, kcal, carb, gras in columnas]
+
+    @property
+    def nbytes(self):
+        return (self._postings.nbytes + self._inicio.nbytes + self.n_trigramas.nbytes + self.largo.nbytes
+                + self._texto.nbytes + self._offsets.nbytes + self.en_catalogo.nbytes)
+
+
+class Buscador:
+    """
+    Índice de la versión vigente del catálogo, por proceso de la API. El primer uso (o un
+    cambio de versión del catálogo) lanza la carga/reconstrucción en un hilo
+    y, mientras tanto, buscar() devuelve None (→ Postgres) o el índice anterior.
+    """
+
+    def __init__(self):
+        self._indice = None
+        self._lock = threading.Lock()
+        self._construyendo = False
+        self.en_memoria = 0
+        self.en_bbdd = 0
+
+    def buscar(self, q, limite=BUSCAR_LIMITE, solo_catalogo=False):
+        indice = self._vigente()
+        if indice is None:
+            return None
+        self.en_memoria += 1
+        return indice.resultados(indice.buscar(q, limite, solo_catalogo))
+
+    def buscar_bbdd(self, db, q, limite=BUSCAR_LIMITE, solo_catalogo=False):
+        """Respaldo en Postgres (mismo orden de relevancia salvo el parecido con erratas)."""
+        self.en_bbdd += 1
+        consulta = plegar(q).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        sql = SQL_BUSCAR_CATALOGO if solo_catalogo else SQL_BUSCAR
+        filas = db.execute(text(sql), {"contiene": f"%{consulta}%", "empieza": f"{consulta}%",
+                                               "palabra": f"% {consulta}%", "limite": limite}).mappings()
+        salida = []
+        for r in filas:
+            factor = max(float(r['peso_gramos'] or 100), 1) / 100.0
+            salida.append({
+                "nombre": r['nombre'],
+                "precio": round(float(r['precio']), 2),
+                "tipo": r['tipo'],
+                "emoji": r['emoji'] or "",
+                "imagen_url": r['imagen_url'] or "",
+                "momentos": r['momentos'] or ["comida", "cena"],
+                "prot_pack": round((r['proteinas_100g'] or 0) * factor, 1),
+                "kcal_pack": round((r['calorias_100g'] or 0) * factor, 0),
+                "carb_pack": round((r['carbohidratos_100g'] or 0) * factor, 1),
+                "gras_pack": round((r['grasas_100g'] or 0) * factor, 1),
+            })
+        return salida
+
+    def metricas(self):
+        indice = self._indice
+        return {"listo": indice is not None,
+                "version": indice.version if indice else None,
+                "productos": len(indice.plegados) if indice else 0,
+                "trigramas": len(indice._ids) if indice else 0,
+                "memoria_mb": round(indice.nbytes / 1e6, 2) if indice else 0,
+                "construccion_s": round(indice.segundos, 3) if indice else None,
+                "en_memoria": self.en_memoria, "en_bbdd": self.en_bbdd}
+
+    # --- internos ---
+
+    def _vigente(self):
+        indice = self._indice
+        try:
+            # Solo la huella de versión (como mucho una consulta por intervalo): la
+            # API no necesita el catálogo del optimizador en memoria
+            version = version_catalogo()
+        except Exception:
+            return indice  # sin BBDD se sigue con el que haya
+        if indice is not None and indice.version == version:
+            return indice
+        with self._lock:
+            if not self._construyendo:
+                self._construyendo = True
+                threading.Thread(target=self._construir, args=(version,), name="buscador-indice",
+                                 daemon=True).start()
+        return indice  # el anterior (versión vieja) o None
+
+    def _construir(self, version):
+        try:
+            if self._indice is None or self._indice.version != version:
+                # Versión leída antes de cargar: si cambia durante la carga, se reconstruye otra vez
+                indice = IndiceBusqueda(cargar_productos(busqueda=True), version)
+                self._indice = indice
+                print(f"[BUSCAR] Índice de {len(indice.plegados)} productos, {len(indice._ids)} trigramas "
+                      f"en {indice.segundos:.2f}s ({indice.nbytes / 1e6:.1f} MB)")
+        except Exception as e:
+            print(f"[BUSCAR] No se pudo construir el índice: {e}")
+        finally:
+            self._construyendo = False
+
+
+buscador = Buscador()
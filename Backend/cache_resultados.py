@@ -0,0 +1,257 @@
+"""
+Caché de resultados de /optimizar.
+- Clave = forma canónica de la DietaRequest (presupuesto y macros cuantizados,
+  exclusiones ordenadas, hash de los productos fijados) + versión del catálogo
+- Se resuelve con los valores exactos de la petición; solo la clave se
+  cuantiza, con pasos que no dejan servir una cesta que se salga de la
+  petición (presupuesto al céntimo hacia abajo: los precios van en céntimos)
+- LRU + TTL + tope de memoria, con nivel opcional en disco (RESULTADOS_DIR)
+- Al cambiar la versión del catálogo se purgan las entradas antiguas
+- Las respuestas cortadas por el límite de tiempo (versiones "factible")
+  no se guardan: el tiempo no forma parte de la clave
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+TTL_S = int(os.environ.get("RESULTADOS_TTL_S", "3600"))
+MAX_ENTRADAS = int(os.environ.get("RESULTADOS_MAX_ENTRADAS", "2000"))
+MAX_BYTES = int(float(os.environ.get("RESULTADOS_MAX_MB", "64")) * 1024 * 1024)
+DIR_DISCO = os.environ.get("RESULTADOS_DIR") or None
+
+# Pasos de cuantización de la clave. Presupuesto y kcal se redondean hacia
+# abajo (son máximos), proteína hacia arriba (es un mínimo), carbos/grasas al
+# más cercano (±15%). Pasos más gruesos (0.5€, 10 kcal) darían más aciertos,
+# pero servirían cestas resueltas para otro presupuesto: 57.4€ a quien pidió 57.3€.
+PASO_PRESUPUESTO = 0.01
+PASO_PROTEINA = 0.1
+PASO_KCAL = 1
+PASO_MACRO = 0.1
+
+# Campos numéricos de la petición → (paso, redondeo) en la clave
+_CUANTIZACION = {
+    "presupuesto_max": (PASO_PRESUPUESTO, math.floor),
+    "proteina_diaria": (PASO_PROTEINA, math.ceil),
+    "kcal_diaria": (PASO_KCAL, math.floor),
+    "carbohidratos_diarios": (PASO_MACRO, round),
+    "grasas_diarias": (PASO_MACRO, round),
+}
+
+
+def _cuantizar(valor, paso, redondeo=round):
+    if valor is None:
+        return None
+    # round(…, 6) antes: 57.3 / 0.01 = 5729.999… no debe bajar a 57.29
+    return round(redondeo(round(valor / paso, 6)) * paso, 6)
+
+
+def _hash_fijas(secciones_fijas):
+    """
+    Solo el nombre (con su "(xN)") influye en el solver: se ignora el resto.
+    Ordenar secciones e items es seguro porque _parsear_fijas tampoco
+    depende del orden (recorre las secciones en orden_secciones y suma qty).
+    """
+    canon = {sec: sorted(item['nombre'] for item in items)
+             for sec, items in sorted(secciones_fijas.items()) if items}
+    return hashlib.sha256(json.dumps(canon, ensure_ascii=False, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def normalizar_peticion(request):
+    """
+    DietaRequest → kwargs para generar_propuestas_api, con los valores
+    exactos de la petición (es lo que se resuelve). El ruido (orden de
+    exclusiones, 57.301€ vs 57.30€...) lo absorbe clave_peticion.
+    """
+    solo_version = request.solo_version.upper() if request.solo_version else None
+    secciones_fijas = request.secciones_fijas or None
+    if not (solo_version and secciones_fijas):
+        # generar_propuestas_api ignora uno sin el otro
+        solo_version, secciones_fijas = None, None
+    return {
+        "presupuesto_max": float(request.presupuesto),
+        "proteina_diaria": float(request.proteinas),
+        "kcal_diaria": float(request.calorias),
+        "carbohidratos_diarios": float(request.carbohidratos) if request.carbohidratos else None,
+        "grasas_diarias": float(request.grasas) if request.grasas else None,
+        "excluir_tipos": sorted(set(request.excluir_tipos)) if request.excluir_tipos else None,
+        "secciones_fijas": secciones_fijas,
+        "solo_version": solo_version,
+    }
+
+
+def clave_peticion(kwargs, version_catalogo):
+    canon = {k: v for k, v in kwargs.items() if k != "secciones_fijas"}
+    for campo, (paso, redondeo) in _CUANTIZACION.items():
+        if campo in canon:
+            canon[campo] = _cuantizar(canon[campo], paso, redondeo)
+    canon["fijas"] = _hash_fijas(kwargs["secciones_fijas"]) if kwargs.get("secciones_fijas") else None
+    canon["catalogo"] = version_catalogo
+    return hashlib.sha256(json.dumps(canon, sort_keys=True).encode()).hexdigest()
+
+
+def resultado_definitivo(resultado):
+    """
+    False si alguna versión se cortó por tiempo (incumbente o sin solución):
+    con más tiempo la respuesta sería otra, así que no se cachea.
+    """
+    return not any(isinstance(v, dict) and v.get("estado") in ("factible", "sin_solucion")
+                   for v in resultado.values())
+
+
+def _prefijo_version(version_catalogo):
+    return hashlib.sha256(str(version_catalogo).encode()).hexdigest()[:12]
+
+
+class CacheResultados:
+    """LRU en memoria (valores serializados, tamaño exacto) + nivel en disco opcional."""
+
+    def __init__(self, ttl_s=TTL_S, max_entradas=MAX_ENTRADAS, max_bytes=MAX_BYTES, dir_disco=DIR_DISCO):
+        self.ttl_s = ttl_s
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.dir_disco = dir_disco
+        if dir_disco:
+            os.makedirs(dir_disco, exist_ok=True)
+        self._entradas = OrderedDict()  # clave -> (expira_en, version, json)
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self.expiradas = 0
+        self.desalojadas = 0
+        self.invalidaciones = 0
+
+    def obtener(self, kwargs, version_catalogo):
+        self._comprobar_version(version_catalogo)
+        clave = clave_peticion(kwargs, version_catalogo)
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if entrada[0] > ahora:
+                    self._entradas.move_to_end(clave)
+                    self.hits_memoria += 1
+                    return json.loads(entrada[2])
+                self._quitar(clave)
+                self.expiradas += 1
+
+        valor = self._leer_disco(clave, version_catalogo, ahora)
+        with self._lock:
+            if valor is None:
+                self.misses += 1
+                return None
+            self.hits_disco += 1
+            self._meter(clave, version_catalogo, valor[0], valor[1])
+        return json.loads(valor[1])
+
+    def guardar(self, kwargs, version_catalogo, resultado):
+        if version_catalogo != self._version or not resultado_definitivo(resultado):
+            # Resuelto con otro catálogo que el vigente (ventana de recarga) o cortado
+            # por el límite de tiempo: no se guarda
+            return
+        clave = clave_peticion(kwargs, version_catalogo)
+        serializado = json.dumps(resultado, ensure_ascii=False, default=str)
+        expira_en = time.time() + self.ttl_s
+        with self._lock:
+            self._meter(clave, version_catalogo, expira_en, serializado)
+        self._escribir_disco(clave, version_catalogo, expira_en, serializado)
+
+    def metricas(self):
+        hits = self.hits_memoria + self.hits_disco
+        total = hits + self.misses
+        return {
+            "entradas": len(self._entradas),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits_memoria": self.hits_memoria,
+            "hits_disco": self.hits_disco,
+            "misses": self.misses,
+            "hit_ratio": round(hits / total, 4) if total else None,
+            "expiradas": self.expiradas,
+            "desalojadas": self.desalojadas,
+            "invalidaciones": self.invalidaciones,
+            "disco": self.dir_disco,
+        }
+
+    # --- internos ---
+
+    def _comprobar_version(self, version_catalogo):
+        """Catálogo nuevo → todo lo anterior es basura (memoria y disco)."""
+        if version_catalogo == self._version:
+            return
+        with self._lock:
+            if version_catalogo == self._version:
+                return
+            anterior, self._version = self._version, version_catalogo
+            if anterior is not None:
+                self._entradas.clear()
+                self._bytes = 0
+                self.invalidaciones += 1
+        self._purgar_disco(conservar_version=version_catalogo)
+
+    def _meter(self, clave, version, expira_en, serializado):
+        if clave in self._entradas:
+            self._quitar(clave)
+        self._entradas[clave] = (expira_en, version, serializado)
+        self._bytes += len(serializado)
+        while self._entradas and (len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes):
+            self._quitar(next(iter(self._entradas)))
+            self.desalojadas += 1
+
+    def _quitar(self, clave):
+        _, _, serializado = self._entradas.pop(clave)
+        self._bytes -= len(serializado)
+
+    def _ruta(self, clave, version):
+        return os.path.join(self.dir_disco, f"{_prefijo_version(version)}_{clave}.json")
+
+    def _leer_disco(self, clave, version, ahora):
+        if not self.dir_disco:
+            return None
+        ruta = self._ruta(clave, version)
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                expira_en = float(f.readline())
+                serializado = f.read()
+        except (OSError, ValueError):
+            return None
+        if expira_en <= ahora:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+            return None
+        return expira_en, serializado
+
+    def _escribir_disco(self, clave, version, expira_en, serializado):
+        if not self.dir_disco:
+            return
+        ruta = self._ruta(clave, version)
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(f"{expira_en}\n")
+                f.write(serializado)
+            os.replace(tmp, ruta)  # atómico: nunca se lee un fichero a medias
+        except OSError as e:
+            print(f"[CACHE] No se pudo escribir en disco: {e}")
+
+    def _purgar_disco(self, conservar_version):
+        if not self.dir_disco:
+            return
+        prefijo = _prefijo_version(conservar_version) if conservar_version is not None else None
+        for nombre in os.listdir(self.dir_disco):
+            if prefijo is None or not nombre.startswith(prefijo + "_"):
+                try:
+                    os.remove(os.path.join(self.dir_disco, nombre))
+                except OSError:
+                    pass
+
+
+cache_resultados = CacheResultados()
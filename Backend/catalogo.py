@@ -0,0 +1,462 @@
+"""
+Catálogo de productos en memoria (caché de proceso).
+- Una sola carga de la fuente (fuentes_catalogo: Postgres, o un fichero
+  sqlite/csv/parquet con CATALOGO_FUENTE) por versión
+- Versión del catálogo = huella barata de la fuente (recuentos + max(id) +
+  suma de precios en BBDD; tamaño + mtime en ficheros)
+- Un hilo en segundo plano recarga el snapshot cuando cambia la versión
+- Productos en columnas (TablaProductos); los filtros por petición
+  (excluir_tipos) son vistas de índices sobre la misma tabla, no copias
+"""
+import bisect
+import os
+import threading
+import time
+from array import array
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+from fuentes_catalogo import COLUMNAS, DATABASE_URL, TIPOS_FUERA, fuente_desde_url, get_engine  # noqa: F401
+
+# Cada cuánto se comprueba si el catálogo ha cambiado en la fuente
+INTERVALO_REFRESCO_S = int(os.environ.get("CATALOGO_INTERVALO_S", "60"))
+
+# De dónde se carga (ver fuentes_catalogo): Postgres salvo que se diga otra cosa
+FUENTE = fuente_desde_url(os.environ.get("CATALOGO_FUENTE"))
+
+
+def leer_version(fuente=None):
+    return (fuente or FUENTE).version()
+
+
+def cargar_productos(fuente=None, busqueda=False):
+    """
+    Lee la fuente por lotes (cursor de servidor en Postgres) y vuelca cada
+    fila directamente en la tabla columnar: no hay DataFrame ni un dict por
+    producto en ningún momento.
+    busqueda: también los TIPOS_FUERA (lo que se puede buscar, no lo que
+    usa el optimizador).
+    """
+    fuente = fuente or FUENTE
+    constructor = ConstructorTabla(deduplicar=fuente.deduplicar, tipos_fuera=() if busqueda else TIPOS_FUERA)
+    for fila in fuente.filas(busqueda=busqueda):
+        constructor.agregar_fila(fila)
+    productos = constructor.vista()
+    print(f"[LOAD] {len(productos)} productos{' (búsqueda)' if busqueda else ''} ({fuente!r})")
+    return productos
+
+
+def preparar_productos(productos):
+    """Dicts con las columnas de QUERY_PRODUCTOS → catálogo columnar que usa el optimizador."""
+    constructor = ConstructorTabla()
+    for p in productos:
+        constructor.agregar_fila(tuple(p.get(col) for col in COLUMNAS))
+    return constructor.vista()
+
+
+def compactar(productos):
+    """Dicts ya preparados (precio, *_pack, comidas...) → VistaProductos. safe_id = posición."""
+    constructor = ConstructorTabla()
+    for p in productos:
+        constructor.agregar(p.get('id') or 0, p['nombre'], p['precio'], p.get('imagen_url'), p['tipo'],
+                            p.get('emoji'), p['comidas'], p['prot_pack'], p['kcal_pack'],
+                            p['carb_pack'], p['gras_pack'])
+    return constructor.vista()
+
+
+# =====================================================================
+# CATÁLOGO COLUMNAR
+# =====================================================================
+SECCIONES = ['desayuno', 'comida', 'merienda', 'cena']  # bit j de TablaProductos.secciones
+COMIDAS_POR_DEFECTO = ['comida', 'cena']
+
+
+class Cadenas:
+    """Tabla de strings: un solo bloque UTF-8 + offsets, sin un objeto str por producto."""
+
+    def __init__(self, textos):
+        datos = [(t or '').encode('utf-8') for t in textos]
+        self.blob = b''.join(datos)
+        self.offsets = np.zeros(len(datos) + 1, np.uint32 if len(self.blob) < 2 ** 32 else np.int64)
+        self.offsets[1:] = np.cumsum([len(d) for d in datos])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+
+    @property
+    def nbytes(self):
+        return len(self.blob) + self.offsets.nbytes
+
+
+class ConstructorTabla:
+    """
+    Va llenando las columnas de una TablaProductos fila a fila (arrays de
+    la stdlib y listas de strings, ~300 B/producto mientras se carga).
+    deduplicar: aplica aquí lo que QUERY_PRODUCTOS hace en Postgres
+    (precio > 0, sin tipos_fuera, un producto por nombre, el más barato)
+    para fuentes que no lo garantizan; el más barato sustituye al otro en
+    su fila, así el orden (y los safe_id) es el de primera aparición.
+    """
+
+    def __init__(self, deduplicar=False, tipos_fuera=TIPOS_FUERA):
+        self.id = array('q')
+        self.precio = array('d')
+        self.prot_pack = array('d')
+        self.kcal_pack = array('d')
+        self.carb_pack = array('d')
+        self.gras_pack = array('d')
+        self.tipo = array('H')
+        self.emoji = array('H')
+        self.secciones = array('B')
+        self.nombres = []
+        self.imagenes = []
+        self._tipos = {}
+        self._emojis = {}
+        self._bits = {s: 1 << j for j, s in enumerate(SECCIONES)}
+        self._fila_de = {} if deduplicar else None
+        self._tipos_fuera = tipos_fuera
+
+    def agregar_fila(self, fila):
+        """Fila de la fuente (COLUMNAS, por posición): macros por 100 g → por pack."""
+        (id_, nombre, precio, peso, imagen_url, tipo, emoji, momentos,
+         prot_100g, carb_100g, gras_100g, kcal_100g) = fila
+        factor = max(float(peso or 100), 1) / 100.0
+        self.agregar(id_, nombre, float(precio or 0), imagen_url, tipo, emoji,
+                     momentos or COMIDAS_POR_DEFECTO,
+                     (prot_100g or 0) * factor, (kcal_100g or 0) * factor,
+                     (carb_100g or 0) * factor, (gras_100g or 0) * factor)
+
+    def agregar(self, id_, nombre, precio, imagen_url, tipo, emoji, comidas, prot, kcal, carb, gras):
+        """Un producto ya preparado (macros por pack)."""
+        k = len(self.precio)
+        if self._fila_de is not None:
+            if precio <= 0 or tipo in self._tipos_fuera:
+                return
+            previa = self._fila_de.get(nombre)
+            if previa is not None:
+                if precio >= self.precio[previa]:
+                    return
+                k = previa
+            else:
+                self._fila_de[nombre] = k
+        valores = (
+            (self.id, id_ or 0), (self.precio, precio),
+            (self.prot_pack, prot), (self.kcal_pack, kcal), (self.carb_pack, carb), (self.gras_pack, gras),
+            (self.tipo, self._tipos.setdefault(tipo, len(self._tipos))),
+            (self.emoji, self._emojis.setdefault(emoji or '', len(self._emojis))),
+            (self.secciones, sum(self._bits.get(s, 0) for s in set(comidas))),
+            (self.nombres, nombre), (self.imagenes, imagen_url),
+        )
+        if k == len(self.precio):
+            for columna, valor in valores:
+                columna.append(valor)
+        else:
+            for columna, valor in valores:
+                columna[k] = valor
+
+    def tabla(self):
+        t = object.__new__(TablaProductos)
+        for nombre in ('id', 'precio', 'prot_pack', 'kcal_pack', 'carb_pack', 'gras_pack', 'secciones'):
+            setattr(t, nombre, np.array(getattr(self, nombre)))
+        t.tipos, t.emojis = list(self._tipos), list(self._emojis)
+        t.tipo = np.array(self.tipo, dtype=np.min_scalar_type(max(len(t.tipos) - 1, 0)))
+        t.emoji = np.array(self.emoji, dtype=np.min_scalar_type(max(len(t.emojis) - 1, 0)))
+        t.nombres = Cadenas(self.nombres)
+        t.imagenes = Cadenas(self.imagenes)
+        return t
+
+    def vista(self):
+        """VistaProductos de toda la tabla (lo que guarda el snapshot)."""
+        tabla = self.tabla()
+        return VistaProductos(tabla, np.arange(len(tabla), dtype=np.int32))
+
+
+class TablaProductos:
+    """
+    Catálogo en columnas, fila = safe_id (inmutable, compartido por todas las vistas):
+    - id, precio y macros por pack en arrays NumPy (float64: los mismos números que antes)
+    - tipo y emoji internados: código uint8 por fila + lista de valores (tipos, emojis)
+    - secciones (comidas) como máscara de bits sobre SECCIONES
+    - nombre e imagen_url en tablas de strings (Cadenas)
+    Memoria por producto (catálogo sintético de 10k-100k, tracemalloc,
+    Benchmarks/bench_memoria.py): ~1.350 B con un dict por producto → ~200 B;
+    cada vista por excluir_tipos ~6 B → ~3 B. Se construye con ConstructorTabla.
+    """
+
+    _orden_nombres = None  # safe_id por orden alfabético (sid_de), se calcula al primer uso
+
+    def __len__(self):
+        return len(self.precio)
+
+    @property
+    def nbytes(self):
+        arrays = (self.id, self.precio, self.prot_pack, self.kcal_pack, self.carb_pack, self.gras_pack,
+                  self.tipo, self.emoji, self.secciones)
+        return sum(a.nbytes for a in arrays) + self.nombres.nbytes + self.imagenes.nbytes
+
+    def sid_de(self, nombre):
+        """safe_id del producto con ese nombre, o None (búsqueda binaria, 4 B/producto de índice)."""
+        if self._orden_nombres is None:
+            nombres = np.array([self.nombres[i] for i in range(len(self))], dtype=object)
+            self._orden_nombres = np.argsort(nombres, kind='stable').astype(np.int32)
+        orden = self._orden_nombres
+        k = bisect.bisect_left(orden, nombre, key=lambda sid: self.nombres[sid])
+        if k < len(orden) and self.nombres[orden[k]] == nombre:
+            return int(orden[k])
+        return None
+
+
+_CAMPOS = {
+    'safe_id': lambda t, i: i,
+    'id': lambda t, i: int(t.id[i]),
+    'nombre': lambda t, i: t.nombres[i],
+    'precio': lambda t, i: float(t.precio[i]),
+    'tipo': lambda t, i: t.tipos[t.tipo[i]],
+    'emoji': lambda t, i: t.emojis[t.emoji[i]],
+    'imagen_url': lambda t, i: t.imagenes[i],
+    'prot_pack': lambda t, i: float(t.prot_pack[i]),
+    'kcal_pack': lambda t, i: float(t.kcal_pack[i]),
+    'carb_pack': lambda t, i: float(t.carb_pack[i]),
+    'gras_pack': lambda t, i: float(t.gras_pack[i]),
+    'comidas': lambda t, i: [s for j, s in enumerate(SECCIONES) if t.secciones[i] >> j & 1],
+}
+
+
+class Producto(Mapping):
+    """Una fila de la tabla leída como el dict de antes (p['nombre'], p.get('emoji'), dict(p))."""
+    __slots__ = ('_tabla', '_i')
+
+    def __init__(self, tabla, i):
+        self._tabla = tabla
+        self._i = i
+
+    def __getitem__(self, campo):
+        return _CAMPOS[campo](self._tabla, self._i)
+
+    def __iter__(self):
+        return iter(_CAMPOS)
+
+    def __len__(self):
+        return len(_CAMPOS)
+
+    def __repr__(self):
+        return f"Producto({self._i}, {self['nombre']!r})"
+
+
+class VistaProductos(Sequence):
+    """
+    Filas de una TablaProductos (sid: safe_id ordenados, int32). Filtrar
+    crea otra vista con menos índices, nunca copia columnas ni productos.
+    """
+
+    def __init__(self, tabla, sid):
+        self.tabla = tabla
+        self.sid = sid
+
+    def __len__(self):
+        return len(self.sid)
+
+    def __getitem__(self, k):
+        return Producto(self.tabla, int(self.sid[k]))
+
+    def __iter__(self):
+        tabla = self.tabla
+        return (Producto(tabla, s) for s in self.sid.tolist())
+
+    def columna(self, nombre):
+        """Array de la columna `nombre` de la tabla para las filas de la vista."""
+        return getattr(self.tabla, nombre)[self.sid]
+
+    def filtrar(self, mascara):
+        return VistaProductos(self.tabla, self.sid[mascara])
+
+    def sin_tipos(self, tipos):
+        codigos = [k for k, t in enumerate(self.tabla.tipos) if t in tipos]
+        return self.filtrar(~np.isin(self.columna('tipo'), codigos))
+
+    def sid_de(self, nombre):
+        """safe_id del producto con ese nombre si está en la vista, o None."""
+        sid = self.tabla.sid_de(nombre)
+        if sid is None:
+            return None
+        k = np.searchsorted(self.sid, sid)
+        return sid if k < len(self.sid) and self.sid[k] == sid else None
+
+
+class CatalogoSnapshot:
+    """
+    Foto inmutable del catálogo para una versión concreta.
+    productos es una VistaProductos de todo el catálogo; las vistas por
+    filtro comparten su TablaProductos (solo añaden 4 B/producto de índices).
+    safe_id es estable dentro del snapshot (fila en la tabla).
+    """
+
+    def __init__(self, version, productos):
+        self.version = version
+        self.productos = productos
+        self.cargado_en = time.time()
+        self._vistas = {}
+        self._lock = threading.Lock()
+
+    def vista(self, excluir_tipos=None):
+        """Productos sin los tipos excluidos (memoizada por filtro)."""
+        clave = frozenset(excluir_tipos or ())
+        if not clave:
+            return self.productos
+        vista = self._vistas.get(clave)
+        if vista is None:
+            with self._lock:
+                vista = self._vistas.get(clave)
+                if vista is None:
+                    vista = self.productos.sin_tipos(clave)
+                    self._vistas[clave] = vista
+        return vista
+
+
+class CatalogoCache:
+    """
+    Caché de catálogo por proceso.
+    - obtener(): devuelve el snapshot actual (carga síncrona solo la primera vez)
+    - Un hilo daemon comprueba la versión cada INTERVALO_REFRESCO_S y recarga
+      en segundo plano; las peticiones siguen usando el snapshot anterior
+      hasta que el nuevo está listo (swap atómico).
+    """
+
+    def __init__(self, cargador=cargar_productos, lector_version=leer_version,
+                 intervalo_s=INTERVALO_REFRESCO_S):
+        self._cargador = cargador
+        self._lector_version = lector_version
+        self._intervalo_s = intervalo_s
+        self._snapshot = None
+        self._lock_carga = threading.Lock()
+        self._lock_hilo = threading.Lock()
+        self._hilo = None
+        self._hilo_pid = None
+        self.hits = 0
+        self.misses = 0
+        self.recargas = 0
+        self.errores = 0
+        self.ultima_comprobacion = None
+        self._version_ligera = None
+
+    def obtener(self):
+        snap = self._snapshot
+        if snap is not None:
+            self.hits += 1
+            self._asegurar_hilo()
+            return snap
+
+        with self._lock_carga:
+            if self._snapshot is None:
+                self.misses += 1
+                self._snapshot = self._cargar()
+            else:
+                self.hits += 1
+        self._asegurar_hilo()
+        return self._snapshot
+
+    def refrescar(self, forzar=False):
+        """Recarga si la versión en BBDD ha cambiado. Devuelve True si recargó."""
+        version = self._lector_version()
+        self.ultima_comprobacion = time.time()
+        snap = self._snapshot
+        if not forzar and snap is not None and snap.version == version:
+            return False
+        with self._lock_carga:
+            nuevo = CatalogoSnapshot(version, self._cargador())
+            self._snapshot = nuevo
+            self.recargas += 1
+        print(f"[CATALOGO] Recargado -> version {version} ({len(nuevo.productos)} prods)")
+        return True
+
+    def cargado(self):
+        """Snapshot actual o None si aún no se ha cargado (no dispara la carga)."""
+        return self._snapshot
+
+    def version(self):
+        snap = self._snapshot
+        return snap.version if snap is not None else None
+
+    def version_actual(self):
+        """
+        Versión vigente sin cargar productos (p.ej. el proceso de la API, que
+        delega los solves al pool). Si hay snapshot, manda el snapshot; si no,
+        se consulta la huella en BBDD como mucho cada intervalo_s.
+        """
+        snap = self._snapshot
+        if snap is not None:
+            return snap.version
+        ligera = self._version_ligera
+        if ligera is None or time.time() - ligera[1] >= self._intervalo_s:
+            ligera = (self._lector_version(), time.time())
+            self._version_ligera = ligera
+        return ligera[0]
+
+    def metricas(self):
+        snap = self._snapshot
+        total = self.hits + self.misses
+        return {
+            "version": snap.version if snap else None,
+            "productos": len(snap.productos) if snap else 0,
+            "edad_s": round(time.time() - snap.cargado_en, 1) if snap else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+            "recargas": self.recargas,
+            "errores_refresco": self.errores,
+            "intervalo_s": self._intervalo_s,
+        }
+
+    # --- internos ---
+
+    def _cargar(self):
+        # La versión se lee ANTES que los productos: si cambia entre medias,
+        # el siguiente refresco verá una versión distinta y recargará.
+        version = self._lector_version()
+        return CatalogoSnapshot(version, self._cargador())
+
+    def _asegurar_hilo(self):
+        # Tras un fork (pool de procesos) el hilo del padre no existe en el hijo
+        pid = os.getpid()
+        if self._hilo is not None and self._hilo_pid == pid and self._hilo.is_alive():
+            return
+        if self._intervalo_s <= 0:
+            return
+        with self._lock_hilo:
+            if self._hilo is not None and self._hilo_pid == pid and self._hilo.is_alive():
+                return
+            self._hilo_pid = pid
+            self._hilo = threading.Thread(target=self._bucle, name="catalogo-refresco", daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            time.sleep(self._intervalo_s)
+            try:
+                self.refrescar()
+            except Exception as e:
+                self.errores += 1
+                print(f"[CATALOGO] Error refrescando: {e}")
+
+
+_cache = CatalogoCache()
+
+
+def obtener_catalogo():
+    return _cache.obtener()
+
+
+def catalogo_cargado():
+    return _cache.cargado()
+
+
+def version_catalogo():
+    return _cache.version_actual()
+
+
+def metricas_catalogo():
+    return _cache.metricas()
@@ -0,0 +1,148 @@
+"""
+Single-flight de /optimizar: peticiones idénticas (misma clave canónica +
+versión de catálogo) que llegan mientras otra igual se está resolviendo
+esperan su resultado en vez de lanzar otro solver.
+- Dentro de un proceso: un asyncio.Future por clave
+- Entre workers de uvicorn: un fichero de lock por clave en VUELO_DIR
+  (flock). El líder lo mantiene mientras resuelve y deja el resultado en
+  <clave>.json; quien esperaba el lock lo lee al conseguirlo. El resultado
+  vale VUELO_RESULTADO_S segundos (solo cubre a los que llegaron "a la vez")
+- Sin fcntl (Windows) o con VUELO_DIR vacío solo se deduplica en el proceso
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+VUELO_DIR = os.environ.get("VUELO_DIR", os.path.join(tempfile.gettempdir(), "mercadona_en_vuelo"))
+VUELO_RESULTADO_S = float(os.environ.get("VUELO_RESULTADO_S", "10"))
+VUELO_SONDEO_S = 0.05
+# Cada cuántos liderazgos se barren resultados caducados y locks viejos
+VUELO_PURGA_CADA = 200
+
+
+class EnVuelo:
+    """
+    Se usa desde el event loop de FastAPI (un solo hilo), así que el mapa de
+    futuros y los contadores no necesitan lock.
+    """
+
+    def __init__(self, directorio=VUELO_DIR, resultado_s=VUELO_RESULTADO_S):
+        self.directorio = directorio if fcntl is not None else None
+        self.resultado_s = resultado_s
+        if self.directorio:
+            os.makedirs(self.directorio, exist_ok=True)
+        self._futuros = {}  # clave -> Future(json del resultado | None si el líder se canceló)
+        self.lideres = 0
+        self.seguidores_proceso = 0
+        self.seguidores_otros = 0
+
+    async def resolver(self, clave, calcular):
+        """
+        Devuelve el resultado de `await calcular()` para `clave`, calculándolo
+        solo si nadie lo está haciendo ya. Cada llamada recibe su propia copia.
+        """
+        while True:
+            futuro = self._futuros.get(clave)
+            if futuro is None:
+                break
+            serializado = await asyncio.shield(futuro)
+            if serializado is not None:
+                self.seguidores_proceso += 1
+                return json.loads(serializado)
+            # El líder se canceló (cliente desconectado): otro toma el relevo
+
+        futuro = asyncio.get_running_loop().create_future()
+        # Si nadie esperaba, que asyncio no avise de "exception was never retrieved"
+        futuro.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._futuros[clave] = futuro
+        try:
+            serializado = await self._entre_procesos(clave, calcular)
+        except asyncio.CancelledError:
+            futuro.set_result(None)
+            raise
+        except Exception as e:
+            futuro.set_exception(e)
+            raise
+        else:
+            futuro.set_result(serializado)
+        finally:
+            del self._futuros[clave]
+        return json.loads(serializado)
+
+    def metricas(self):
+        return {"en_curso": len(self._futuros), "lideres": self.lideres,
+                "seguidores_proceso": self.seguidores_proceso,
+                "seguidores_otros_workers": self.seguidores_otros,
+                "directorio": self.directorio}
+
+    # --- internos ---
+
+    async def _entre_procesos(self, clave, calcular):
+        if not self.directorio:
+            self.lideres += 1
+            return json.dumps(await calcular(), default=str)
+
+        ruta = os.path.join(self.directorio, clave)
+        fd = os.open(f"{ruta}.lock", os.O_CREAT | os.O_RDWR)
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(VUELO_SONDEO_S)
+            # Con el lock en la mano: si otro worker acaba de resolverlo, su resultado vale
+            serializado = self._leer(f"{ruta}.json")
+            if serializado is not None:
+                self.seguidores_otros += 1
+                return serializado
+            self.lideres += 1
+            serializado = json.dumps(await calcular(), default=str)
+            self._escribir(f"{ruta}.json", serializado)
+            if self.lideres % VUELO_PURGA_CADA == 0:
+                self._purgar()
+            return serializado
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _leer(self, ruta):
+        try:
+            if time.time() - os.path.getmtime(ruta) > self.resultado_s:
+                return None
+            with open(ruta, encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _escribir(self, ruta, serializado):
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(serializado)
+            os.replace(tmp, ruta)
+        except OSError as e:
+            print(f"[VUELO] No se pudo escribir el resultado compartido: {e}")
+
+    def _purgar(self):
+        # Los .lock se dejan una hora: borrar uno que alguien tiene abierto
+        # solo costaría, como mucho, una resolución duplicada
+        ahora = time.time()
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                edad = ahora - os.path.getmtime(ruta)
+                if (nombre.endswith(".json") and edad > self.resultado_s) or edad > 3600:
+                    os.remove(ruta)
+            except OSError:
+                pass
+
+
+en_vuelo = EnVuelo()
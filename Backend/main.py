@@ -1,13 +1,29 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from sqlalchemy import text
 from sqlalchemy.orm import Session
-import sys, os, base64, uuid
+import sys, os, base64, uuid, asyncio, json, time
+from datetime import datetime
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from optimizer_logic import generar_propuestas_api
+from optimizer_logic import (
+    generar_propuestas_api, generar_version_api, resolver_lote, fin_peticion, limite_version
+)
+from catalogo import metricas_catalogo, version_catalogo
+from cache_resultados import cache_resultados, clave_peticion, normalizar_peticion
+from solver_pool import solver_pool, PoolSaturado
+from sesiones import sesiones
+from en_vuelo import en_vuelo
+from metricas import metricas, juntar, server_timing
+from rejilla import rejilla
+from buscador import buscador, preparar_indice_bbdd
+import trabajos
+import pedidos
 from database import get_db
 from auth import hash_password, verify_password, create_access_token, require_auth, get_current_user_id
 from models import (
@@ -19,7 +35,16 @@ from models import (
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-app = FastAPI(title="Mercadona Optimizer API", version="6.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pool de procesos del solver: arranca los workers y precarga el catálogo
+    solver_pool.arrancar()
+    await solver_pool.calentar()
+    yield
+    solver_pool.parar()
+
+
+app = FastAPI(title="Mercadona Optimizer API", version="6.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,6 +52,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
 # Servir archivos estáticos (fotos de perfil)
@@ -171,65 +197,422 @@ def get_perfiles():
 def read_root():
     return {"status": "online", "version": "6.1.0"}
 
+async def _ejecutar_medido(fn, **kwargs):
+    """solver_pool.ejecutar + las _metricas del worker, con el tiempo de cola (espera del pool + IPC)."""
+    t0 = time.perf_counter()
+    resultado = await solver_pool.ejecutar(fn, **kwargs)
+    medidas = resultado.pop("_metricas", None)
+    if medidas:
+        medidas["cola"] = max(0.0, time.perf_counter() - t0 - medidas["total"])
+    return resultado, medidas
+
+
+# Cada cuánto se mira si el cliente de /optimizar sigue conectado
+DESCONEXION_SONDEO_S = 0.25
+
+
+async def _mientras_conectado(http_request, corrutina):
+    """
+    Espera `corrutina` vigilando la conexión: si el cliente se va antes, la
+    cancela (el pool marca la tarea y el worker abandona el solve y las
+    versiones que falten) y devuelve None.
+    """
+    tarea = asyncio.ensure_future(corrutina)
+    while True:
+        hechas, _ = await asyncio.wait({tarea}, timeout=DESCONEXION_SONDEO_S)
+        if hechas:
+            return tarea.result()
+        if await http_request.is_disconnected():
+            tarea.cancel()
+            await asyncio.gather(tarea, return_exceptions=True)
+            return None
+
+
+def _version_vigente():
+    """Versión del catálogo (puede consultar la BBDD) o None si no se puede saber."""
+    try:
+        return version_catalogo()
+    except Exception as e:
+        print(f"[CACHE] Sin versión de catálogo, se omite la caché: {e}")
+        return None
+
+
+def _precalculado(kwargs, version):
+    """
+    (resultado, origen) de la rejilla o de la caché de resultados; resultado
+    None si no está en ninguna. Bloqueante (SQL de la rejilla al recargar,
+    ficheros de la caché): desde los endpoints async, con run_in_threadpool.
+    """
+    resultado = rejilla.obtener(kwargs, version)
+    if resultado is not None:
+        return resultado, "rejilla"
+    return cache_resultados.obtener(kwargs, version), "cache"
+
+
 @app.post("/optimizar")
-def post_optimizar(request: DietaRequest):
+async def post_optimizar(request: DietaRequest, http_request: Request, response: Response):
+    t0 = time.perf_counter()
     try:
-        resultado = generar_propuestas_api(
-            presupuesto_max=request.presupuesto,
-            proteina_diaria=request.proteinas,
-            kcal_diaria=request.calorias,
-            carbohidratos_diarios=request.carbohidratos,
-            grasas_diarias=request.grasas,
-            excluir_tipos=request.excluir_tipos,
-            secciones_fijas=request.secciones_fijas,
-            solo_version=request.solo_version,
-        )
+        # Se resuelve con los valores exactos; clave_peticion los cuantiza para caché y rejilla
+        kwargs = normalizar_peticion(request)
+        # Versión, rejilla y caché pueden ir a la BBDD o a disco: fuera del event loop
+        version = await run_in_threadpool(_version_vigente)
+
+        resultado, origen, medidas = None, "cache", None
+        if version is not None:
+            # Perfil sin modificar en un presupuesto de la rejilla: respuesta precalculada
+            resultado, origen = await run_in_threadpool(_precalculado, kwargs, version)
+        if resultado is None:
+            origen = "vuelo"  # pasa a "solver" si esta petición es la que resuelve
+            # Las cestas previas son solo MIP start: no forman parte de la clave de caché
+            cesta_previa, cestas_previas = None, None
+            if kwargs["solo_version"]:
+                cesta_previa = request.cesta_previa or sesiones.cesta(request.sesion_id, kwargs["solo_version"])
+            elif version is not None:
+                cestas_previas = await run_in_threadpool(rejilla.vecina, kwargs, version)
+
+            async def calcular():
+                nonlocal origen, medidas
+                resultado, medidas = await _ejecutar_medido(generar_propuestas_api, **kwargs,
+                                                            cesta_previa=cesta_previa, cestas_previas=cestas_previas,
+                                                            tiempo_max_s=request.tiempo_max_s)
+                origen = "solver"
+                version_usada = resultado.pop("_catalogo_version", None)
+                if version is not None and "error" not in resultado:
+                    await run_in_threadpool(cache_resultados.guardar, kwargs, version_usada, resultado)
+                return resultado
+
+            # Doble clic / varias pestañas: las peticiones idénticas en curso esperan a la primera
+            clave = clave_peticion({**kwargs, "tiempo_max_s": request.tiempo_max_s}, version)
+            resultado = await _mientras_conectado(http_request, en_vuelo.resolver(clave, calcular))
+            if resultado is None:
+                print("[OPTIMIZAR] Cliente desconectado: petición cancelada")
+                # Nadie va a leer esta respuesta (499 = cliente cerró, convención de nginx)
+                return Response(status_code=499)
+
+        resultado["sesion_id"] = sesiones.guardar(resultado, request.sesion_id)
+        total = time.perf_counter() - t0
+        metricas.registrar("/optimizar", origen, total, medidas)
+        response.headers["Server-Timing"] = server_timing(total, origen, medidas)
         return resultado
+    except PoolSaturado as e:
+        raise HTTPException(
+            status_code=503,
+            detail="El optimizador está saturado, inténtalo de nuevo en unos segundos",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
         print(f"Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _evento(**datos):
+    return json.dumps(datos, default=str) + "\n"
+
+
+@app.post("/optimizar/stream")
+async def post_optimizar_stream(request: DietaRequest):
+    """
+    Igual que /optimizar pero en NDJSON: cada versión se envía en cuanto
+    se resuelve, sin esperar a las demás.
+      {"evento": "progreso", "version": "A", "estado": "resolviendo"}
+      {"evento": "version", "version": "A", "datos": {...}}  (mismo JSON que version_a)
+      {"evento": "fin", "sesion_id": "...", "cache": bool, "server_timing": "..."}
+      {"evento": "error", "error": "...", "retry_after": s}  (pool saturado / fallo)
+    A, B y C son tareas separadas del pool: B espera a A (penaliza sus
+    productos), C a A y B. El presupuesto de tiempo se reparte aquí igual
+    que en generar_propuestas_api.
+    """
+    kwargs = normalizar_peticion(request)
+
+    async def eventos():
+        t0 = time.perf_counter()
+
+        def fin_evento(resultado, origen, medidas=None):
+            total = time.perf_counter() - t0
+            metricas.registrar("/optimizar/stream", origen, total, medidas)
+            return _evento(evento="fin", sesion_id=sesiones.guardar(resultado, request.sesion_id),
+                           cache=origen in ("rejilla", "cache"),
+                           server_timing=server_timing(total, origen, medidas))
+
+        try:
+            version = await run_in_threadpool(_version_vigente)
+            resultado, origen, medidas = None, "cache", None
+            if version is not None:
+                resultado, origen = await run_in_threadpool(_precalculado, kwargs, version)
+            if resultado is None and kwargs["solo_version"]:
+                # Regenerar una versión: una sola resolución, no hay nada que adelantar
+                cesta_previa = request.cesta_previa or sesiones.cesta(request.sesion_id, kwargs["solo_version"])
+                yield _evento(evento="progreso", version=kwargs["solo_version"], estado="resolviendo")
+                resultado, medidas = await _ejecutar_medido(generar_propuestas_api, **kwargs,
+                                                            cesta_previa=cesta_previa,
+                                                            tiempo_max_s=request.tiempo_max_s)
+                resultado.pop("_catalogo_version", None)
+                origen = "solver"
+            if resultado is not None:
+                if "error" in resultado:
+                    yield _evento(evento="error", error=resultado["error"])
+                    return
+                for clave, datos in resultado.items():
+                    if clave.startswith("version_"):
+                        yield _evento(evento="version", version=clave[len("version_"):].upper(), datos=datos)
+                yield fin_evento(resultado, origen, medidas)
+                return
+
+            cestas_previas = {}
+            if version is not None:
+                cestas_previas = await run_in_threadpool(rejilla.vecina, kwargs, version) or {}
+            base = {k: kwargs[k] for k in ("presupuesto_max", "proteina_diaria", "kcal_diaria",
+                                           "carbohidratos_diarios", "grasas_diarias", "excluir_tipos")}
+            fin = fin_peticion(request.tiempo_max_s)
+            resultado, penalizar, versiones_catalogo, partes = {}, [], set(), []
+            for restantes, nombre in ((3, "A"), (2, "B"), (1, "C")):
+                clave = f"version_{nombre.lower()}"
+                va = resultado.get("version_a")
+                if va is not None and va.get("estado") == "infactible":
+                    # B y C solo cambian el objetivo: mismas restricciones, misma respuesta
+                    resultado[clave] = {**va, "version": nombre}
+                else:
+                    yield _evento(evento="progreso", version=nombre, estado="resolviendo")
+                    v, medidas = await _ejecutar_medido(generar_version_api, **base, version_name=nombre,
+                                                        penalizar_ids=penalizar,
+                                                        cesta_previa=cestas_previas.get(nombre),
+                                                        limite_s=limite_version(fin, restantes))
+                    partes.append(medidas)
+                    versiones_catalogo.add(v.pop("_catalogo_version", None))
+                    penalizar = penalizar + v.pop("_ids_usados", [])
+                    resultado[clave] = v
+                yield _evento(evento="version", version=nombre, datos=resultado[clave])
+
+            # Todas las versiones del mismo snapshot: vale como respuesta de /optimizar
+            if version is not None and len(versiones_catalogo) == 1:
+                await run_in_threadpool(cache_resultados.guardar, kwargs, versiones_catalogo.pop(), resultado)
+            yield fin_evento(resultado, "solver", juntar(partes))
+        except PoolSaturado as e:
+            yield _evento(evento="error", error="El optimizador está saturado, inténtalo de nuevo en unos segundos",
+                          retry_after=e.retry_after)
+        except Exception as e:
+            print(f"Error: {e}")
+            yield _evento(evento="error", error=str(e))
+
+    return StreamingResponse(eventos(), media_type="application/x-ndjson")
+
+
+@app.post("/optimizar/jobs", status_code=202)
+def post_optimizar_job(request: DietaRequest):
+    """
+    Encola la petición y devuelve {"job_id", "estado"} al momento; el
+    resultado se consulta en GET /optimizar/jobs/{job_id}. La resuelven los
+    workers de trabajos.py, no el pool de la API.
+    """
+    kwargs = normalizar_peticion(request)
+    version = _version_vigente()
+    try:
+        resultado = None
+        if version is not None:
+            resultado, _ = _precalculado(kwargs, version)
+        if resultado is not None:
+            return {"job_id": trabajos.registrar_hecho(kwargs, resultado), "estado": "hecho"}
+
+        # Los MIP start se calculan aquí: el worker no tiene sesiones ni rejilla
+        peticion = {**kwargs, "tiempo_max_s": request.tiempo_max_s}
+        if kwargs["solo_version"]:
+            peticion["cesta_previa"] = request.cesta_previa or sesiones.cesta(request.sesion_id,
+                                                                             kwargs["solo_version"])
+        elif version is not None:
+            peticion["cestas_previas"] = rejilla.vecina(kwargs, version)
+        return {"job_id": trabajos.encolar(peticion), "estado": "pendiente"}
+    except Exception as e:
+        print(f"Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/optimizar/jobs/{job_id}")
+def get_optimizar_job(job_id: str):
+    """Estado del trabajo: pendiente (con posición en cola), en_curso, hecho (con resultado) o error."""
+    trabajo = trabajos.consultar(job_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    respuesta = {"job_id": job_id, "estado": trabajo["estado"], "intentos": trabajo["intentos"],
+                 "creado_en": trabajo["creado_en"], "empezado_en": trabajo["empezado_en"],
+                 "terminado_en": trabajo["terminado_en"]}
+    if trabajo["estado"] == "pendiente":
+        respuesta["posicion"] = trabajos.posicion_en_cola(job_id)
+    elif trabajo["estado"] == "error":
+        respuesta["error"] = trabajo["error"]
+    elif trabajo["estado"] == "hecho":
+        resultado = trabajo["resultado"]
+        sesion_id = trabajo["sesion_id"]
+        if sesion_id is None:
+            # Primera lectura: caché y sesión una sola vez, los sondeos siguientes solo leen
+            sesion_id, primera = trabajos.consumir(job_id, lambda: sesiones.guardar(resultado))
+            if primera and trabajo["catalogo_version"]:
+                peticion = {k: v for k, v in trabajo["peticion"].items()
+                            if k not in ("tiempo_max_s", "cesta_previa", "cestas_previas")}
+                cache_resultados.guardar(peticion, trabajo["catalogo_version"], resultado)
+        resultado["sesion_id"] = sesion_id
+        respuesta["resultado"] = resultado
+    return respuesta
+
+
+# Peticiones por tarea del pool en /optimizar/batch (comparten plantilla en el worker)
+BATCH_TAMANO_LOTE = int(os.environ.get("BATCH_TAMANO_LOTE", "4"))
+BATCH_REINTENTOS = 3
+
+
+async def _resolver_trozo(trozo):
+    """[(índice, kwargs)] → [(índice, resultado)]; reintenta si el pool está saturado."""
+    for intento in range(BATCH_REINTENTOS + 1):
+        try:
+            resultados = await solver_pool.ejecutar(resolver_lote, [kw for _, kw in trozo])
+            return [(trozo[j][0], r) for j, r in resultados]
+        except PoolSaturado as e:
+            if intento == BATCH_REINTENTOS:
+                raise
+            await asyncio.sleep(e.retry_after)
+
+
+@app.post("/optimizar/batch")
+async def post_optimizar_batch(peticiones: list[DietaRequest]):
+    """
+    Lote de peticiones (p.ej. la generación nocturna para todos los usuarios).
+    Respuesta NDJSON: una línea {"indice", "resultado"} o {"indice", "error"}
+    por petición según van terminando, y una línea final {"fin": true, ...}.
+    Los aciertos de caché salen primero; las peticiones idénticas (misma
+    forma canónica) se resuelven una sola vez; el resto se reparte en trozos
+    de BATCH_TAMANO_LOTE entre los workers, como mucho uno por worker a la
+    vez para no acaparar la cola de /optimizar.
+    """
+    async def lineas():
+        version = await run_in_threadpool(_version_vigente)
+
+        pendientes, iguales, errores, aciertos = [], {}, 0, 0
+        for i, peticion in enumerate(peticiones):
+            kwargs = normalizar_peticion(peticion)
+            clave = clave_peticion(kwargs, version)
+            if clave in iguales:
+                iguales[clave].append(i)
+                continue
+            cacheado = None
+            if version is not None:
+                cacheado = await run_in_threadpool(cache_resultados.obtener, kwargs, version)
+            if cacheado is not None:
+                aciertos += 1
+                yield json.dumps({"indice": i, "resultado": cacheado}, default=str) + "\n"
+            else:
+                iguales[clave] = [i]
+                pendientes.append((i, {**kwargs, "tiempo_max_s": peticion.tiempo_max_s}))
+        # índice resuelto → todos los índices con su misma petición canónica
+        duplicados = {indices[0]: indices for indices in iguales.values()}
+
+        trozos = [pendientes[j:j + BATCH_TAMANO_LOTE] for j in range(0, len(pendientes), BATCH_TAMANO_LOTE)]
+        en_vuelo = asyncio.Semaphore(solver_pool.n_workers)
+
+        async def con_limite(trozo):
+            async with en_vuelo:
+                try:
+                    return trozo, await _resolver_trozo(trozo), None
+                except Exception as e:
+                    return trozo, None, e
+
+        for tarea in asyncio.as_completed([con_limite(t) for t in trozos]):
+            trozo, resultados, fallo = await tarea
+            if fallo is not None:
+                # Falla el trozo entero (pool caído/saturado): se informa por petición y se sigue
+                for i0, _ in trozo:
+                    for i in duplicados[i0]:
+                        errores += 1
+                        yield json.dumps({"indice": i, "error": str(fallo)}) + "\n"
+                continue
+            kwargs_por_indice = dict(trozo)
+            for i0, resultado in resultados:
+                version_usada = resultado.pop("_catalogo_version", None)
+                medidas = resultado.pop("_metricas", None)
+                if medidas:
+                    metricas.registrar("/optimizar/batch", "solver", medidas["total"], medidas)
+                if "error" in resultado:
+                    errores += len(duplicados[i0])
+                    lineas_item = [{"indice": i, "error": resultado["error"]} for i in duplicados[i0]]
+                else:
+                    if version is not None:
+                        kwargs = {k: v for k, v in kwargs_por_indice[i0].items() if k != "tiempo_max_s"}
+                        await run_in_threadpool(cache_resultados.guardar, kwargs, version_usada, resultado)
+                    lineas_item = [{"indice": i, "resultado": resultado} for i in duplicados[i0]]
+                for linea in lineas_item:
+                    yield json.dumps(linea, default=str) + "\n"
+
+        yield json.dumps({"fin": True, "total": len(peticiones), "errores": errores,
+                          "cache": aciertos}) + "\n"
+
+    return StreamingResponse(lineas(), media_type="application/x-ndjson")
+
+
+@app.get("/catalogo/metricas")
+def get_metricas_catalogo():
+    """Estado de la caché de catálogo: versión, hits/misses y recargas."""
+    return metricas_catalogo()
+
+
+@app.get("/solver/metricas")
+def get_metricas_solver():
+    """Estado del pool de procesos del solver (workers, cola, rechazos)."""
+    return solver_pool.metricas()
+
+
+@app.get("/optimizar/cache")
+def get_metricas_cache():
+    """Estado de la caché de resultados (hit ratio, memoria, desalojos), de la rejilla y del single-flight."""
+    return {**cache_resultados.metricas(), "rejilla": rejilla.metricas(), "en_vuelo": en_vuelo.metricas()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Métricas Prometheus de este proceso: tiempos por fase, tamaño del modelo, pool, caché y single-flight."""
+    pool, cache, vuelo = solver_pool.metricas(), cache_resultados.metricas(), en_vuelo.metricas()
+    return metricas.exponer(extra={
+        "optimizer_pool_en_curso": ("Tareas en el pool (en ejecución + en cola)", "gauge", pool["en_curso"]),
+        "optimizer_pool_rechazadas_total": ("Peticiones rechazadas por cola llena", "counter", pool["rechazadas"]),
+        "optimizer_pool_canceladas_total": ("Tareas canceladas por desconexión", "counter", pool["canceladas"]),
+        "optimizer_cache_hits_total": ("Aciertos de la caché de resultados", "counter",
+                                       cache["hits_memoria"] + cache["hits_disco"]),
+        "optimizer_cache_misses_total": ("Fallos de la caché de resultados", "counter", cache["misses"]),
+        "optimizer_en_vuelo_en_curso": ("Peticiones distintas resolviéndose (single-flight)", "gauge",
+                                        vuelo["en_curso"]),
+        "optimizer_en_vuelo_lideres_total": ("Peticiones que resolvieron ellas mismas", "counter",
+                                             vuelo["lideres"]),
+        "optimizer_en_vuelo_seguidores_proceso_total": ("Peticiones que esperaron a una idéntica de este proceso",
+                                                        "counter", vuelo["seguidores_proceso"]),
+        "optimizer_en_vuelo_seguidores_otros_workers_total": (
+            "Peticiones que esperaron a una idéntica de otro worker", "counter", vuelo["seguidores_otros_workers"]),
+    })
+
+
 @app.get("/buscar-productos")
-def buscar_productos(q: str = "", db: Session = Depends(get_db)):
-    """Busca productos por nombre. Devuelve hasta 20 resultados con macros."""
-    if len(q) < 2:
+def buscar_productos(q: str = "", solo_catalogo: bool = False, db: Session = Depends(get_db)):
+    """
+    Busca productos por nombre (sin tildes, por prefijo, a media palabra y
+    tolerando erratas), ordenados por relevancia. Hasta 20 resultados con
+    macros por pack, entre todos los productos con precio; solo_catalogo:
+    solo los que usa el optimizador. Índice en memoria; mientras se
+    construye, Postgres.
+    """
+    if len(q.strip()) < 2:
         return []
-    rows = db.execute(
-        text("""
-            SELECT p.id, p.nombre, p.precio, p.peso_gramos, p.imagen_url,
-                   c.tipo, c.emoji, p.momentos,
-                   n.proteinas_100g, n.carbohidratos_100g, n.grasas_100g, n.calorias_100g
-            FROM productos_v2 p
-            JOIN categorias c ON p.categoria_id = c.id
-            JOIN nutricion n ON n.producto_id = p.id
-            WHERE p.nombre ILIKE :q AND p.precio > 0
-            ORDER BY p.nombre ASC
-            LIMIT 20
-        """),
-        {"q": f"%{q}%"}
-    ).fetchall()
-    result = []
-    for r in rows:
-        peso = max(float(r[3] or 100), 1)
-        factor = peso / 100.0
-        result.append({
-            "nombre": r[1],
-            "precio": round(float(r[2]), 2),
-            "tipo": r[5],
-            "emoji": r[6] or "",
-            "imagen_url": r[4] or "",
-            "momentos": r[7] or ["comida", "cena"],
-            "prot_pack": round((r[8] or 0) * factor, 1),
-            "kcal_pack": round((r[11] or 0) * factor, 0),
-            "carb_pack": round((r[9] or 0) * factor, 1),
-            "gras_pack": round((r[10] or 0) * factor, 1),
-        })
-    return result
+    resultados = buscador.buscar(q, solo_catalogo=solo_catalogo)
+    if resultados is None:
+        resultados = buscador.buscar_bbdd(db, q, solo_catalogo=solo_catalogo)
+    return resultados
+
+
+@app.get("/buscar-productos/metricas")
+def get_metricas_buscador():
+    """Estado del índice de búsqueda: versión, tamaño y consultas servidas desde memoria/BBDD."""
+    return buscador.metricas()
+
+
 @app.post("/pedidos")
 def crear_pedido(req: PedidoRequest, user_id: int = Depends(require_auth), db: Session = Depends(get_db)):
     """Crea un nuevo pedido guardando la cesta comprada por el usuario."""
-    import json
     result = db.execute(
         text("""
             INSERT INTO pedidos (usuario_id, precio_total, version_label, macros_json, secciones_json)
@@ -244,37 +627,117 @@ def crear_pedido(req: PedidoRequest, user_id: int = Depends(require_auth), db: S
             "secciones": json.dumps(req.secciones_json)
         }
     )
-    db.commit()
     row = result.fetchone()
+    # Líneas normalizadas y agregados semanales para la analítica, en la misma transacción
+    pedidos.expandir_pedido(db, row[0])
+    pedidos.sumar_semana(db, row[0])
+    db.commit()
     return {"id": row[0], "fecha": row[1], "message": "Pedido realizado con éxito"}
 
+# Historial paginado por keyset sobre (fecha, id): cada página es un index
+# scan de idx_pedidos_usuario_fecha desde el cursor, cueste lo mismo la
+# primera que la página 500 (OFFSET recorrería todas las anteriores)
+PEDIDOS_POR_PAGINA = 20
+PEDIDOS_POR_PAGINA_MAX = 100
+
+
+def _cursor_pedidos(fecha, pedido_id):
+    return base64.urlsafe_b64encode(f"{fecha.isoformat()}|{pedido_id}".encode()).decode()
+
+
+def _leer_cursor_pedidos(cursor):
+    try:
+        fecha, pedido_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(fecha), int(pedido_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor no válido")
+
+
 @app.get("/pedidos")
-def listar_pedidos(user_id: int = Depends(require_auth), db: Session = Depends(get_db)):
-    """Devuelve el historial de pedidos del usuario, ordenado por fecha desc."""
+def listar_pedidos(cursor: str | None = None, limite: int = PEDIDOS_POR_PAGINA,
+                   user_id: int = Depends(require_auth), db: Session = Depends(get_db)):
+    """
+    Historial de pedidos del usuario, del más reciente al más antiguo, en
+    páginas de `limite`. Solo el resumen (sin secciones_json: ver
+    GET /pedidos/{id}). `siguiente` es el cursor de la página siguiente
+    (None si no hay más).
+    """
+    limite = max(1, min(limite, PEDIDOS_POR_PAGINA_MAX))
+    filtro, params = "", {"uid": user_id, "n": limite + 1}
+    if cursor:
+        params["fecha"], params["id"] = _leer_cursor_pedidos(cursor)
+        filtro = "AND (fecha, id) < (:fecha, :id)"
     rows = db.execute(
-        text("""
-            SELECT id, fecha, precio_total, version_label, macros_json, secciones_json
+        text(f"""
+            SELECT id, fecha, precio_total, version_label, macros_json
             FROM pedidos
-            WHERE usuario_id = :uid
-            ORDER BY fecha DESC
+            WHERE usuario_id = :uid {filtro}
+            ORDER BY fecha DESC, id DESC
+            LIMIT :n
         """),
-        {"uid": user_id}
+        params
     ).fetchall()
-    
-    pedidos = []
-    for r in rows:
-        pedidos.append({
+
+    resumenes = []
+    for r in rows[:limite]:
+        resumenes.append({
             "id": r[0],
             "fecha": r[1].isoformat(),
             "precio_total": float(r[2]),
             "version_label": r[3],
             "macros_json": r[4] if isinstance(r[4], dict) else {},
-            "secciones_json": r[5] if isinstance(r[5], dict) else {}
         })
-    return pedidos
+    siguiente = _cursor_pedidos(rows[limite - 1][1], rows[limite - 1][0]) if len(rows) > limite else None
+    return {"pedidos": resumenes, "siguiente": siguiente}
+
+
+@app.get("/pedidos/analitica/productos")
+def analitica_top_productos(limite: int = 10, dias: int | None = None,
+                            user_id: int = Depends(require_auth), db: Session = Depends(get_db)):
+    """Productos que más compra el usuario (unidades, gasto, veces comprado), desde siempre o en los últimos `dias`."""
+    return pedidos.top_productos(db, user_id, limite=max(1, min(limite, 100)), dias=dias)
+
 
-def _init_db():
-    engine = get_db().__next__().bind
+@app.get("/pedidos/analitica/gasto")
+def analitica_gasto(meses: int = 12, user_id: int = Depends(require_auth), db: Session = Depends(get_db)):
+    """Gasto por mes y tipo de producto en los últimos `meses` (incluido el actual)."""
+    return pedidos.gasto_por_tipo_mes(db, user_id, meses=max(1, meses))
+
+
+@app.get("/pedidos/stats")
+def estadisticas_pedidos(semanas: int = 26, user_id: int = Depends(require_auth), db: Session = Depends(get_db)):
+    """
+    Tendencia semanal de las últimas `semanas` (gasto, macros medias por
+    cesta, € por gramo de proteína) desde pedidos_semana: coste constante
+    sea cual sea el historial.
+    """
+    return pedidos.stats_semanales(db, user_id, semanas=semanas)
+
+
+@app.get("/pedidos/{pedido_id}")
+def obtener_pedido(pedido_id: int, user_id: int = Depends(require_auth), db: Session = Depends(get_db)):
+    """Detalle de un pedido del usuario, con la cesta completa (secciones_json)."""
+    r = db.execute(
+        text("""
+            SELECT id, fecha, precio_total, version_label, macros_json, secciones_json
+            FROM pedidos
+            WHERE id = :id AND usuario_id = :uid
+        """),
+        {"id": pedido_id, "uid": user_id}
+    ).fetchone()
+    if r is None:
+        raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    return {
+        "id": r[0],
+        "fecha": r[1].isoformat(),
+        "precio_total": float(r[2]),
+        "version_label": r[3],
+        "macros_json": r[4] if isinstance(r[4], dict) else {},
+        "secciones_json": r[5] if isinstance(r[5], dict) else {}
+    }
+
+def _init_db(engine=None):
+    engine = engine or get_db().__next__().bind
     with engine.connect() as conn:
         conn.execute(text("""
             CREATE TABLE IF NOT EXISTS pedidos (
@@ -287,7 +750,17 @@ def _init_db():
                 secciones_json JSONB NOT NULL
             );
         """))
+        # Historial por usuario (keyset en GET /pedidos)
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS idx_pedidos_usuario_fecha
+                ON pedidos (usuario_id, fecha DESC, id DESC);
+        """))
+        conn.execute(text(pedidos.SQL_CREAR))
         conn.commit()
+    # Índices de productos_v2 (CREATE INDEX CONCURRENTLY, fuera de transacción):
+    # nombre para expandir pedidos y pg_trgm para el respaldo de /buscar-productos
+    pedidos.preparar_indice_productos(engine)
+    preparar_indice_bbdd(engine)
 
 if __name__ == "__main__":
     _init_db()
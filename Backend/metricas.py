@@ -0,0 +1,130 @@
+"""
+Métricas del optimizador para /metrics (formato texto de Prometheus, sin
+dependencias) y cabecera Server-Timing.
+- Los workers del pool miden cada fase (Cronometro de optimizer_logic) y
+  lo devuelven en la clave _metricas del resultado; aquí se agrega
+- Fases: catalogo (BBDD/snapshot), filtro, plantilla (préstamo/compilación
+  del modelo), parcheo, precheck, solve (CBC/HiGHS) y extraccion, las
+  cuatro últimas por versión; "cola" = espera del pool + IPC
+- Por proceso: con varios workers de uvicorn cada uno expone los suyos
+"""
+import bisect
+import threading
+
+BUCKETS_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+BUCKETS_TAMANO = (100, 300, 1000, 3000, 10000, 30000, 100000, 300000, 1000000)
+
+
+def _etiquetas(pares):
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pares) + "}"
+
+
+class Histograma:
+
+    def __init__(self, nombre, ayuda, buckets):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = buckets
+        self._series = {}  # etiquetas (tupla de pares) -> [cuentas por bucket, suma, n]
+
+    def observar(self, valor, **etiquetas):
+        clave = tuple(sorted(etiquetas.items()))
+        serie = self._series.get(clave)
+        if serie is None:
+            serie = self._series[clave] = [[0] * len(self.buckets), 0.0, 0]
+        i = bisect.bisect_left(self.buckets, valor)
+        if i < len(self.buckets):
+            serie[0][i] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for clave, (cuentas, suma, n) in sorted(self._series.items()):
+            acumulado = 0
+            for limite, cuenta in zip(self.buckets, cuentas):
+                acumulado += cuenta
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(clave + (('le', limite),))} {acumulado}")
+            lineas.append(f"{self.nombre}_bucket{_etiquetas(clave + (('le', '+Inf'),))} {n}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(clave)} {suma}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(clave)} {n}")
+        return lineas
+
+
+class MetricasOptimizador:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.peticion = Histograma("optimizer_peticion_segundos",
+                                   "Duración total de la petición en la API", BUCKETS_S)
+        self.fase = Histograma("optimizer_fase_segundos",
+                               "Duración de cada fase del optimizador (version vacía = común)", BUCKETS_S)
+        self.tamano = Histograma("optimizer_modelo_tamano",
+                                 "Tamaño del modelo resuelto (variables, restricciones, nnz)", BUCKETS_TAMANO)
+        self.ultimo_modelo = {}
+
+    def registrar(self, endpoint, origen, total_s, metricas=None):
+        """
+        Una petición terminada. origen: rejilla | cache | solver.
+        metricas: la clave _metricas del resultado del worker (solo si hubo solve).
+        """
+        with self._lock:
+            self.peticion.observar(total_s, endpoint=endpoint, origen=origen)
+            if not metricas:
+                return
+            for fase, s in metricas["fases"].items():
+                self.fase.observar(s, fase=fase, version="")
+            for version, fases in metricas["versiones"].items():
+                for fase, s in fases.items():
+                    self.fase.observar(s, fase=fase, version=version)
+            if metricas.get("cola") is not None:
+                self.fase.observar(metricas["cola"], fase="cola", version="")
+            if metricas.get("modelo"):
+                self.ultimo_modelo = metricas["modelo"]
+                for dimension, valor in metricas["modelo"].items():
+                    self.tamano.observar(valor, dimension=dimension)
+
+    def exponer(self, extra=None):
+        """Texto para /metrics. extra: {nombre: (ayuda, tipo, valor)} de otros módulos (pool, caché...)."""
+        with self._lock:
+            lineas = self.peticion.exponer() + self.fase.exponer() + self.tamano.exponer()
+            lineas += ["# HELP optimizer_modelo_ultimo Tamaño del último modelo resuelto",
+                       "# TYPE optimizer_modelo_ultimo gauge"]
+            lineas += [f'optimizer_modelo_ultimo{{dimension="{d}"}} {v}' for d, v in self.ultimo_modelo.items()]
+        for nombre, (ayuda, tipo, valor) in (extra or {}).items():
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}", f"{nombre} {valor}"]
+        return "\n".join(lineas) + "\n"
+
+
+def juntar(partes):
+    """_metricas de varias tareas (p.ej. A/B/C de /optimizar/stream) → una sola."""
+    partes = [p for p in partes if p]
+    if not partes:
+        return None
+    total = {"total": 0.0, "fases": {}, "versiones": {}, "modelo": None, "cola": 0.0}
+    for p in partes:
+        total["total"] += p["total"]
+        for fase, s in p["fases"].items():
+            total["fases"][fase] = total["fases"].get(fase, 0.0) + s
+        total["versiones"].update(p["versiones"])
+        total["modelo"] = p["modelo"] or total["modelo"]
+        total["cola"] += p.get("cola") or 0.0
+    return total
+
+
+def server_timing(total_s, origen, metricas=None):
+    """Cabecera Server-Timing (ms): total, origen y, si hubo solve, cada fase."""
+    partes = [f'origen;desc="{origen}"']
+    if metricas:
+        partes += [f"{fase};dur={s * 1000:.1f}" for fase, s in metricas["fases"].items()]
+        for version, fases in sorted(metricas["versiones"].items()):
+            partes += [f"{fase}-{version.lower()};dur={s * 1000:.1f}" for fase, s in fases.items()]
+        if metricas.get("cola") is not None:
+            partes.append(f"cola;dur={metricas['cola'] * 1000:.1f}")
+    partes.append(f"total;dur={total_s * 1000:.1f}")
+    return ", ".join(partes)
+
+
+metricas = MetricasOptimizador()
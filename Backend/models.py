@@ -92,6 +92,11 @@ class DietaRequest(BaseModel):
     excluir_tipos: Optional[list[str]] = None
     secciones_fijas: Optional[dict] = None
     solo_version: Optional[str] = None
+    # Regeneración: cesta actual de la versión (MIP start) o sesión que la guarda
+    cesta_previa: Optional[dict] = None
+    sesion_id: Optional[str] = None
+    # Presupuesto de tiempo del solver (segundos); el servidor aplica su propio tope
+    tiempo_max_s: Optional[float] = None
 
 class PedidoRequest(BaseModel):
     precio_total: float
@@ -0,0 +1,294 @@
+"""
+Líneas de pedido normalizadas (pedido_items) para analítica de compras.
+- secciones_json sigue siendo la cesta tal cual se enseña; además cada
+  producto se guarda como fila (pedido, sección, cantidad, precio unitario)
+  en la misma transacción que el pedido (POST /pedidos)
+- Se expande en SQL desde el propio JSONB: "Nombre (x3)" -> cantidad 3,
+  precio unitario = importe / cantidad, producto_id buscando el nombre en
+  productos_v2 (NULL si ya no existe). Nombre y tipo se guardan tal cual se
+  compraron: los ids cambian al re-migrar el catálogo
+- usuario_id y fecha se copian del pedido para que la analítica por usuario
+  sea un range scan de idx_pedido_items_usuario_fecha, sin JOIN ni JSON
+- backfill(): rellena los pedidos anteriores por lotes de ids
+  (idempotente: lo ya expandido se salta)
+- pedidos_semana: agregados por usuario y semana (nº de pedidos, gasto,
+  suma de macros) que POST /pedidos actualiza con un UPSERT en la misma
+  transacción; /pedidos/stats solo lee esta tabla, así que cuesta lo mismo
+  con 10 pedidos que con 10.000. reconstruir_semanas() la rehace desde
+  pedidos (migración inicial o si alguna vez se desincroniza)
+USO: python Backend/pedidos.py backfill [--lote N]
+     python Backend/pedidos.py semanas
+"""
+import os
+import sys
+import time
+
+from sqlalchemy import text
+
+from catalogo import get_engine
+
+PEDIDOS_LOTE_BACKFILL = int(os.environ.get("PEDIDOS_LOTE_BACKFILL", "1000"))
+STATS_SEMANAS_MAX = 520  # 10 años
+
+SQL_CREAR = """
+    CREATE TABLE IF NOT EXISTS pedido_items (
+        pedido_id INTEGER NOT NULL REFERENCES pedidos(id) ON DELETE CASCADE,
+        seccion VARCHAR(20) NOT NULL,
+        posicion INTEGER NOT NULL,
+        usuario_id INTEGER NOT NULL,
+        fecha TIMESTAMP NOT NULL,
+        producto_id INTEGER,
+        nombre TEXT NOT NULL,
+        tipo VARCHAR(30),
+        cantidad INTEGER NOT NULL,
+        precio_unitario DECIMAL(10, 2) NOT NULL,
+        importe DECIMAL(10, 2) NOT NULL,
+        PRIMARY KEY (pedido_id, seccion, posicion)
+    );
+    CREATE INDEX IF NOT EXISTS idx_pedido_items_usuario_fecha ON pedido_items (usuario_id, fecha);
+
+    CREATE TABLE IF NOT EXISTS pedidos_semana (
+        usuario_id INTEGER NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+        semana DATE NOT NULL,
+        pedidos INTEGER NOT NULL,
+        gasto DECIMAL(12, 2) NOT NULL,
+        prot DOUBLE PRECISION NOT NULL,
+        kcal DOUBLE PRECISION NOT NULL,
+        carb DOUBLE PRECISION NOT NULL,
+        gras DOUBLE PRECISION NOT NULL,
+        PRIMARY KEY (usuario_id, semana)
+    );
+"""
+
+# producto_id por nombre al expandir (SQL_EXPANDIR). El índice es del catálogo,
+# no del esquema de pedidos: va aparte y CONCURRENTLY para no bloquear productos_v2
+SQL_INDICE_NOMBRE = "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_productos_v2_nombre ON productos_v2 (nombre)"
+# Un CONCURRENTLY que falla a medias deja el índice INVALID y IF NOT EXISTS ya no lo rehace
+SQL_NOMBRE_INVALIDO = """
+    SELECT 1 FROM pg_index WHERE indexrelid = to_regclass('idx_productos_v2_nombre') AND NOT indisvalid
+"""
+
+
+# {filtro}: qué pedidos expandir (uno al crearlo, un rango de ids en el backfill)
+SQL_EXPANDIR = """
+    INSERT INTO pedido_items (pedido_id, seccion, posicion, usuario_id, fecha, producto_id,
+                              nombre, tipo, cantidad, precio_unitario, importe)
+    SELECT ped.id, s.seccion, e.posicion, ped.usuario_id, ped.fecha, p.id,
+           l.nombre, e.item->>'tipo', l.cantidad,
+           round(l.importe / l.cantidad, 2), l.importe
+    FROM pedidos ped
+    CROSS JOIN LATERAL jsonb_each(ped.secciones_json) s(seccion, items)
+    CROSS JOIN LATERAL jsonb_array_elements(
+        CASE WHEN jsonb_typeof(s.items) = 'array' THEN s.items ELSE '[]'::jsonb END
+    ) WITH ORDINALITY e(item, posicion)
+    CROSS JOIN LATERAL (
+        SELECT regexp_replace(e.item->>'nombre', ' \\(x\\d+\\)$', '') AS nombre,
+               coalesce(substring(e.item->>'nombre' FROM ' \\(x(\\d+)\\)$')::int, 1) AS cantidad,
+               coalesce((e.item->>'precio')::numeric, 0) AS importe
+    ) l
+    LEFT JOIN LATERAL (
+        SELECT id FROM productos_v2 WHERE nombre = l.nombre ORDER BY precio LIMIT 1
+    ) p ON true
+    WHERE {filtro}
+    ON CONFLICT DO NOTHING
+"""
+
+SQL_TOP_PRODUCTOS = """
+    SELECT nombre, max(producto_id) AS producto_id, max(tipo) AS tipo,
+           count(*) AS compras, sum(cantidad) AS unidades,
+           sum(importe) AS gasto, max(fecha) AS ultima_compra
+    FROM pedido_items
+    WHERE usuario_id = :uid AND fecha >= :desde
+    GROUP BY nombre
+    ORDER BY unidades DESC, gasto DESC, nombre
+    LIMIT :limite
+"""
+
+SQL_GASTO_TIPO_MES = """
+    SELECT date_trunc('month', fecha) AS mes, coalesce(tipo, 'otros') AS tipo,
+           sum(importe) AS gasto, sum(cantidad) AS unidades, count(*) AS compras
+    FROM pedido_items
+    WHERE usuario_id = :uid AND fecha >= :desde
+    GROUP BY 1, 2
+    ORDER BY 1 DESC, gasto DESC
+"""
+
+
+def preparar_indice_productos(engine):
+    """Índice por nombre de productos_v2 para SQL_EXPANDIR (sin él, un scan por línea de pedido)."""
+    try:
+        with engine.execution_options(isolation_level="AUTOCOMMIT").connect() as conn:
+            if conn.execute(text(SQL_NOMBRE_INVALIDO)).first():
+                conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS idx_productos_v2_nombre"))
+            conn.execute(text(SQL_INDICE_NOMBRE))
+        print("[PEDIDOS] Índice por nombre de productos_v2 listo")
+    except Exception as e:
+        print(f"[PEDIDOS] Sin índice por nombre de productos_v2 ({e.__class__.__name__})")
+
+
+def _macro(clave):
+    # macros_json es libre (lo manda el frontend): lo que no sea número cuenta 0
+    return (f"CASE WHEN jsonb_typeof(macros_json->'{clave}') = 'number' "
+            f"THEN (macros_json->>'{clave}')::float8 ELSE 0 END")
+
+
+# Semana ISO (lunes). Las macros del pedido son medias diarias de la cesta semanal
+_AGREGADO_SEMANA = f"""
+    SELECT usuario_id, date_trunc('week', fecha)::date AS semana, count(*) AS pedidos,
+           sum(precio_total) AS gasto, sum({_macro('prot')}) AS prot, sum({_macro('kcal')}) AS kcal,
+           sum({_macro('carb')}) AS carb, sum({_macro('gras')}) AS gras
+    FROM pedidos
+    WHERE {{filtro}}
+    GROUP BY 1, 2
+"""
+
+_COLUMNAS_SEMANA = "(usuario_id, semana, pedidos, gasto, prot, kcal, carb, gras)"
+
+# Un pedido nuevo se suma a su semana (el UPSERT bloquea la fila: pedidos simultáneos no se pisan)
+SQL_SUMAR_SEMANA = f"""
+    INSERT INTO pedidos_semana {_COLUMNAS_SEMANA}
+    {_AGREGADO_SEMANA.format(filtro="id = :id")}
+    ON CONFLICT (usuario_id, semana) DO UPDATE SET
+        pedidos = pedidos_semana.pedidos + EXCLUDED.pedidos,
+        gasto = pedidos_semana.gasto + EXCLUDED.gasto,
+        prot = pedidos_semana.prot + EXCLUDED.prot,
+        kcal = pedidos_semana.kcal + EXCLUDED.kcal,
+        carb = pedidos_semana.carb + EXCLUDED.carb,
+        gras = pedidos_semana.gras + EXCLUDED.gras
+"""
+
+# SHARE bloquea los INSERT en pedidos hasta el commit: ningún pedido se cuenta dos veces ni se pierde
+SQL_RECONSTRUIR_SEMANAS = f"""
+    LOCK TABLE pedidos IN SHARE MODE;
+    DELETE FROM pedidos_semana;
+    INSERT INTO pedidos_semana {_COLUMNAS_SEMANA}
+    {_AGREGADO_SEMANA.format(filtro="true")};
+"""
+
+# Serie continua (semanas sin pedidos a 0) de las últimas :n semanas, la actual incluida
+SQL_STATS = """
+    SELECT g.semana::date AS semana, coalesce(s.pedidos, 0) AS pedidos, coalesce(s.gasto, 0) AS gasto,
+           coalesce(s.prot, 0) AS prot, coalesce(s.kcal, 0) AS kcal,
+           coalesce(s.carb, 0) AS carb, coalesce(s.gras, 0) AS gras
+    FROM generate_series(date_trunc('week', CURRENT_TIMESTAMP) - make_interval(weeks => :n - 1),
+                         date_trunc('week', CURRENT_TIMESTAMP), interval '1 week') g(semana)
+    LEFT JOIN pedidos_semana s ON s.usuario_id = :uid AND s.semana = g.semana::date
+    ORDER BY g.semana
+"""
+
+_DESDE_SIEMPRE = "-infinity"
+
+
+def expandir_pedido(db, pedido_id):
+    """Líneas de un pedido recién insertado (sin commit: va en la transacción del pedido)."""
+    return db.execute(text(SQL_EXPANDIR.format(filtro="ped.id = :id")), {"id": pedido_id}).rowcount
+
+
+def sumar_semana(db, pedido_id):
+    """Suma un pedido recién insertado a pedidos_semana (sin commit: va en la transacción del pedido)."""
+    db.execute(text(SQL_SUMAR_SEMANA), {"id": pedido_id})
+
+
+def stats_semanales(db, usuario_id, semanas=26):
+    """
+    Tendencia semanal del usuario leyendo solo pedidos_semana: gasto, macros
+    medias por cesta (por día, como macros_json) y € por gramo de proteína.
+    """
+    semanas = max(1, min(semanas, STATS_SEMANAS_MAX))
+    serie = []
+    for r in db.execute(text(SQL_STATS), {"uid": usuario_id, "n": semanas}):
+        gasto, n = float(r.gasto), r.pedidos
+        serie.append({
+            "semana": r.semana.isoformat(),
+            "pedidos": n,
+            "gasto": round(gasto, 2),
+            "gasto_medio": round(gasto / n, 2) if n else None,
+            "macros_medias": {m: round(getattr(r, m) / n, 1) if n else None
+                              for m in ("prot", "kcal", "carb", "gras")},
+            # La cesta es semanal: los gramos de proteína comprados son 7 × la media diaria
+            "euros_por_g_prot": round(gasto / (7 * r.prot), 4) if r.prot else None,
+        })
+    gasto = sum(s["gasto"] for s in serie)
+    pedidos = sum(s["pedidos"] for s in serie)
+    return {"semanas": serie, "total": {"pedidos": pedidos, "gasto": round(gasto, 2),
+                                        "gasto_medio": round(gasto / pedidos, 2) if pedidos else None}}
+
+
+def top_productos(db, usuario_id, limite=10, dias=None):
+    """Lo que más compra el usuario (por unidades), en los últimos `dias` o desde siempre."""
+    desde = _desde(db, dias=dias)
+    return [{
+        "nombre": r.nombre,
+        "producto_id": r.producto_id,
+        "tipo": r.tipo,
+        "compras": r.compras,
+        "unidades": int(r.unidades),
+        "gasto": float(r.gasto),
+        "ultima_compra": r.ultima_compra.isoformat(),
+    } for r in db.execute(text(SQL_TOP_PRODUCTOS), {"uid": usuario_id, "desde": desde, "limite": limite})]
+
+
+def gasto_por_tipo_mes(db, usuario_id, meses=12):
+    """Gasto y unidades por mes y tipo de producto (mes más reciente primero)."""
+    desde = _desde(db, meses=meses)
+    return [{
+        "mes": r.mes.strftime("%Y-%m"),
+        "tipo": r.tipo,
+        "gasto": float(r.gasto),
+        "unidades": int(r.unidades),
+        "compras": r.compras,
+    } for r in db.execute(text(SQL_GASTO_TIPO_MES), {"uid": usuario_id, "desde": desde})]
+
+
+def _desde(db, dias=None, meses=None):
+    if dias:
+        return db.execute(text("SELECT CURRENT_TIMESTAMP - make_interval(days => :d)"), {"d": dias}).scalar()
+    if meses:
+        # Meses naturales completos: el actual y los meses-1 anteriores
+        return db.execute(text("SELECT date_trunc('month', CURRENT_TIMESTAMP) - make_interval(months => :m)"),
+                          {"m": meses - 1}).scalar()
+    return _DESDE_SIEMPRE
+
+
+def backfill(engine=None, lote=PEDIDOS_LOTE_BACKFILL):
+    """Expande en pedido_items los pedidos que aún no tienen líneas. Devuelve las líneas insertadas."""
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        conn.execute(text(SQL_CREAR))
+        maximo = conn.execute(text("SELECT coalesce(max(id), 0) FROM pedidos")).scalar()
+    sql = text(SQL_EXPANDIR.format(filtro="""
+        ped.id > :desde AND ped.id <= :hasta
+        AND NOT EXISTS (SELECT 1 FROM pedido_items i WHERE i.pedido_id = ped.id)
+    """))
+    t0, total = time.perf_counter(), 0
+    for desde in range(0, maximo, lote):
+        # Un lote por transacción: se puede cortar y relanzar sin repetir nada
+        with engine.begin() as conn:
+            total += conn.execute(sql, {"desde": desde, "hasta": desde + lote}).rowcount
+        print(f"[PEDIDOS] Backfill hasta el pedido {min(desde + lote, maximo)}/{maximo}: {total} líneas")
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE pedido_items"))
+    print(f"[PEDIDOS] Backfill terminado: {total} líneas en {time.perf_counter() - t0:.1f}s")
+    return total
+
+
+def reconstruir_semanas(engine=None):
+    """Rehace pedidos_semana desde pedidos en una transacción (las lecturas ven la tabla vieja o la nueva)."""
+    engine = engine or get_engine()
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text(SQL_CREAR))
+        conn.execute(text(SQL_RECONSTRUIR_SEMANAS))
+        filas = conn.execute(text("SELECT count(*) FROM pedidos_semana")).scalar()
+    print(f"[PEDIDOS] pedidos_semana reconstruida: {filas} semanas-usuario en {time.perf_counter() - t0:.1f}s")
+    return filas
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["backfill"]:
+        backfill(lote=int(args[args.index("--lote") + 1]) if "--lote" in args else PEDIDOS_LOTE_BACKFILL)
+    elif args[:1] == ["semanas"]:
+        reconstruir_semanas()
+    else:
+        sys.exit("USO:" + __doc__.split("USO:")[1].rstrip())
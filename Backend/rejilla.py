@@ -0,0 +1,209 @@
+"""
+Rejilla precalculada de cestas: cada perfil de PERFILES_DIETA × presupuestos
+de REJILLA_MIN a REJILLA_MAX cada REJILLA_PASO euros, por versión de catálogo.
+- Tabla rejilla_cestas, clave = clave_peticion (la misma que la caché de
+  resultados), así una petición de perfil sin tocar acierta sin resolver
+- La API carga en memoria la rejilla de la versión vigente (son ~100 filas)
+- Fuera de la rejilla, la cesta del presupuesto vecino inferior sirve de
+  MIP start (REJILLA_WARM=0 para desactivarlo)
+- El cálculo es incremental: si la vista de catálogo de un perfil (sus
+  tipos no excluidos) no ha cambiado, las filas se re-etiquetan con la
+  versión nueva sin resolver nada
+USO: python Backend/rejilla.py [--forzar]
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy import text
+
+from cache_resultados import clave_peticion, normalizar_peticion, resultado_definitivo
+from catalogo import get_engine, obtener_catalogo
+from models import PERFILES_DIETA, DietaRequest
+
+REJILLA_MIN = int(os.environ.get("REJILLA_MIN", "30"))
+REJILLA_MAX = int(os.environ.get("REJILLA_MAX", "120"))
+REJILLA_PASO = int(os.environ.get("REJILLA_PASO", "5"))
+REJILLA_WARM = os.environ.get("REJILLA_WARM", "1") != "0"
+# La API relee la tabla cada tanto (el trabajo offline puede acabar después)
+REJILLA_RECARGA_S = int(os.environ.get("REJILLA_RECARGA_S", "300"))
+
+PRESUPUESTOS = list(range(REJILLA_MIN, REJILLA_MAX + 1, REJILLA_PASO))
+
+SQL_CREAR = """
+    CREATE TABLE IF NOT EXISTS rejilla_cestas (
+        clave VARCHAR(64) PRIMARY KEY,
+        catalogo_version TEXT NOT NULL,
+        perfil VARCHAR(50) NOT NULL,
+        presupuesto DECIMAL(10, 2) NOT NULL,
+        huella VARCHAR(64) NOT NULL,
+        resultado JSONB NOT NULL,
+        calculado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_rejilla_version ON rejilla_cestas (catalogo_version);
+"""
+
+
+def peticion_perfil(perfil, presupuesto):
+    """kwargs canónicos de un perfil sin modificar con ese presupuesto."""
+    datos = PERFILES_DIETA[perfil]
+    return normalizar_peticion(DietaRequest(
+        presupuesto=presupuesto, proteinas=datos["proteinas"], calorias=datos["calorias"],
+        carbohidratos=datos.get("carbohidratos"), grasas=datos.get("grasas"),
+        excluir_tipos=datos.get("excluir_tipos") or None,
+    ))
+
+
+def huella_vista(productos):
+    """Hash de todo lo que el modelo ve de los productos de una vista."""
+    h = hashlib.sha256()
+    for p in productos:
+        h.update(json.dumps([p['nombre'], p['precio'], p['tipo'], p['comidas'],
+                             round(p['prot_pack'], 3), round(p['kcal_pack'], 3),
+                             round(p['carb_pack'], 3), round(p['gras_pack'], 3)],
+                            ensure_ascii=False, default=str).encode())
+    return h.hexdigest()
+
+
+class Rejilla:
+    """Rejilla de la versión de catálogo vigente, en memoria del proceso de la API."""
+
+    def __init__(self, engine_factory=get_engine):
+        self._engine_factory = engine_factory
+        self._version = None
+        self._cargado_en = 0.0
+        self._cestas = {}  # clave -> resultado
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.warm = 0
+
+    def obtener(self, kwargs, version_catalogo):
+        """Resultado precalculado para exactamente esta petición, o None."""
+        self._cargar(version_catalogo)
+        resultado = self._cestas.get(clave_peticion(kwargs, version_catalogo))
+        if resultado is None:
+            return None
+        self.hits += 1
+        return json.loads(resultado)
+
+    def vecina(self, kwargs, version_catalogo):
+        """Cestas {A/B/C: secciones} del punto de rejilla inferior más cercano (MIP start)."""
+        if not REJILLA_WARM or kwargs.get("solo_version"):
+            return None
+        self._cargar(version_catalogo)
+        for presupuesto in sorted((p for p in PRESUPUESTOS if p <= kwargs["presupuesto_max"]), reverse=True):
+            resultado = self._cestas.get(clave_peticion({**kwargs, "presupuesto_max": float(presupuesto)},
+                                                        version_catalogo))
+            if resultado is not None:
+                self.warm += 1
+                resultado = json.loads(resultado)
+                return {k[len("version_"):].upper(): v["secciones"] for k, v in resultado.items()
+                        if k.startswith("version_") and "secciones" in v}
+        return None
+
+    def metricas(self):
+        return {"version": self._version, "puntos": len(self._cestas),
+                "hits": self.hits, "warm_starts": self.warm}
+
+    def _vigente(self, version_catalogo):
+        return version_catalogo == self._version and time.time() - self._cargado_en < REJILLA_RECARGA_S
+
+    def _cargar(self, version_catalogo):
+        if self._vigente(version_catalogo):
+            return
+        with self._lock:
+            if self._vigente(version_catalogo):
+                return
+            try:
+                with self._engine_factory().connect() as conn:
+                    filas = conn.execute(text("SELECT clave, resultado FROM rejilla_cestas "
+                                              "WHERE catalogo_version = :v"), {"v": version_catalogo}).fetchall()
+                # JSONB llega como dict: se guarda serializado (cada hit devuelve una copia)
+                self._cestas = {clave: json.dumps(r) if not isinstance(r, str) else r for clave, r in filas}
+                print(f"[REJILLA] {len(self._cestas)} cestas precalculadas para la versión {version_catalogo}")
+            except Exception as e:
+                print(f"[REJILLA] No disponible: {e}")
+                self._cestas = {}
+            self._version = version_catalogo
+            self._cargado_en = time.time()
+
+
+rejilla = Rejilla()
+
+
+# =====================================================================
+# TRABAJO OFFLINE
+# =====================================================================
+def precalcular(forzar=False, engine=None):
+    """
+    Rellena rejilla_cestas para la versión de catálogo actual. Devuelve
+    cuántos puntos se resolvieron, re-etiquetaron y ya estaban.
+    """
+    from optimizer_logic import generar_propuestas_batch
+
+    engine = engine or get_engine()
+    catalogo = obtener_catalogo()
+    version = catalogo.version
+    stats = {"resueltos": 0, "reetiquetados": 0, "existentes": 0}
+
+    with engine.begin() as conn:
+        conn.execute(text(SQL_CREAR))
+        filas = conn.execute(text("SELECT clave, catalogo_version, perfil, presupuesto, huella "
+                                  "FROM rejilla_cestas")).fetchall()
+    existentes = {f[0] for f in filas if f[1] == version}
+    # (perfil, presupuesto, huella) de versiones anteriores → clave a re-etiquetar
+    anteriores = {(f[2], float(f[3]), f[4]): f[0] for f in filas if f[1] != version}
+
+    pendientes, vistos = [], set()
+    for perfil, datos in PERFILES_DIETA.items():
+        huella = huella_vista(catalogo.vista(datos.get("excluir_tipos") or None))
+        for presupuesto in PRESUPUESTOS:
+            kwargs = peticion_perfil(perfil, presupuesto)
+            clave = clave_peticion(kwargs, version)
+            if clave in vistos:  # otro perfil con los mismos macros (p.ej. personalizado)
+                continue
+            vistos.add(clave)
+            if clave in existentes and not forzar:
+                stats["existentes"] += 1
+                continue
+            anterior = anteriores.get((perfil, float(presupuesto), huella))
+            if anterior is not None and not forzar:
+                with engine.begin() as conn:
+                    conn.execute(text("UPDATE rejilla_cestas SET clave = :c, catalogo_version = :v "
+                                      "WHERE clave = :a"), {"c": clave, "v": version, "a": anterior})
+                stats["reetiquetados"] += 1
+                continue
+            pendientes.append((clave, perfil, presupuesto, huella, kwargs))
+
+    t0 = time.perf_counter()
+    for i, resultado in generar_propuestas_batch([p[4] for p in pendientes]):
+        clave, perfil, presupuesto, huella, _ = pendientes[i]
+        resultado.pop("_catalogo_version", None)
+        resultado.pop("_metricas", None)
+        if "error" in resultado or not resultado_definitivo(resultado):
+            # Cortado por tiempo: se reintenta en la próxima ejecución
+            print(f"[REJILLA] {perfil} {presupuesto}€ sin guardar: {resultado.get('error', 'no óptimo')}")
+            continue
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO rejilla_cestas (clave, catalogo_version, perfil, presupuesto, huella, resultado)
+                VALUES (:c, :v, :p, :pr, :h, CAST(:r AS JSONB))
+                ON CONFLICT (clave) DO UPDATE SET resultado = EXCLUDED.resultado,
+                    huella = EXCLUDED.huella, calculado_en = CURRENT_TIMESTAMP
+            """), {"c": clave, "v": version, "p": perfil, "pr": presupuesto, "h": huella,
+                   "r": json.dumps(resultado, ensure_ascii=False, default=str)})
+        stats["resueltos"] += 1
+        print(f"[REJILLA] {perfil} {presupuesto}€ ({stats['resueltos']}/{len(pendientes)}, "
+              f"{time.perf_counter() - t0:.0f}s)")
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM rejilla_cestas WHERE catalogo_version <> :v"), {"v": version})
+    print(f"[REJILLA] Versión {version}: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    precalcular(forzar="--forzar" in sys.argv)
@@ -0,0 +1,57 @@
+"""
+Sesiones cortas de /optimizar (memoria del proceso de la API).
+- Cada respuesta de /optimizar lleva un sesion_id con la última cesta de
+  cada versión (A/B/C)
+- Al regenerar una versión (solo_version + secciones_fijas) con ese
+  sesion_id, la cesta guardada se usa como MIP start sin que el cliente
+  tenga que reenviarla (cesta_previa en la petición tiene prioridad)
+- TTL corto y tope de entradas: es una pista de rendimiento, no estado.
+  Con varios workers de uvicorn la sesión puede no estar en el que atiende
+  la petición: entonces simplemente se resuelve en frío.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+SESION_TTL_S = int(os.environ.get("SESION_TTL_S", "1800"))
+SESION_MAX = int(os.environ.get("SESION_MAX", "5000"))
+
+
+class SesionesCesta:
+
+    def __init__(self, ttl_s=SESION_TTL_S, max_entradas=SESION_MAX):
+        self.ttl_s = ttl_s
+        self.max_entradas = max_entradas
+        self._sesiones = OrderedDict()  # sesion_id -> (expira_en, {version: secciones})
+        self._lock = threading.Lock()
+
+    def guardar(self, resultado, sesion_id=None):
+        """Guarda las cestas de `resultado` (se fusionan con las de la sesión). Devuelve el id."""
+        cestas = {clave[len("version_"):].upper(): v["secciones"]
+                  for clave, v in resultado.items()
+                  if clave.startswith("version_") and isinstance(v, dict) and "secciones" in v}
+        ahora = time.time()
+        with self._lock:
+            previa = self._sesiones.pop(sesion_id, None) if sesion_id else None
+            if previa is None or previa[0] <= ahora:
+                sesion_id = uuid.uuid4().hex
+                previa = (0, {})
+            self._sesiones[sesion_id] = (ahora + self.ttl_s, {**previa[1], **cestas})
+            while len(self._sesiones) > self.max_entradas:
+                self._sesiones.popitem(last=False)
+        return sesion_id
+
+    def cesta(self, sesion_id, version):
+        """Secciones de la última cesta de `version` en la sesión, o None."""
+        if not sesion_id or not version:
+            return None
+        with self._lock:
+            entrada = self._sesiones.get(sesion_id)
+            if entrada is None or entrada[0] <= time.time():
+                return None
+            return entrada[1].get(version.upper())
+
+
+sesiones = SesionesCesta()
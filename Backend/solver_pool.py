@@ -0,0 +1,199 @@
+"""
+Pool de procesos dedicado al solver.
+- Un worker por núcleo disponible (SOLVER_WORKERS para fijarlo a mano)
+- Cada worker precarga el catálogo al arrancar (initializer)
+- Concurrencia acotada: si hay más de SOLVER_MAX_COLA peticiones esperando
+  a un worker libre se rechaza con PoolSaturado (→ 503 + Retry-After)
+- Cancelación: cada tarea ocupa una ranura de un array compartido con los
+  workers; si la corrutina que la espera se cancela (cliente desconectado)
+  se marca la ranura y el solver la ve (peticion_cancelada) y abandona
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def _nucleos_disponibles():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Windows / macOS
+        return os.cpu_count() or 1
+
+
+N_WORKERS = int(os.environ.get("SOLVER_WORKERS", "0")) or _nucleos_disponibles()
+MAX_COLA = int(os.environ.get("SOLVER_MAX_COLA", "16"))
+RETRY_AFTER_S = int(os.environ.get("SOLVER_RETRY_AFTER_S", "5"))
+
+
+class PoolSaturado(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Cola del solver llena, reintentar en {retry_after}s")
+        self.retry_after = retry_after
+
+
+# --- Lado worker ---
+_cancelaciones = None  # array compartido: 1 = la tarea de esa ranura está cancelada
+_ranura = None  # ranura de la tarea que ejecuta este worker ahora mismo
+
+
+def peticion_cancelada():
+    """True si la petición que se está resolviendo en este worker ya no la espera nadie."""
+    return _ranura is not None and _cancelaciones[_ranura] != 0
+
+
+def _en_ranura(ranura, fn, args, kwargs):
+    global _ranura
+    _ranura = ranura
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _ranura = None
+
+
+def _init_worker(cancelaciones=None):
+    """Se ejecuta una vez en cada proceso worker: deja el catálogo en memoria."""
+    global _cancelaciones
+    _cancelaciones = cancelaciones
+    from catalogo import obtener_catalogo
+    try:
+        snap = obtener_catalogo()
+        print(f"[POOL] Worker {os.getpid()} listo ({len(snap.productos)} prods)")
+    except Exception as e:
+        # Sin BBDD el worker arranca igual; la primera petición reintentará la carga
+        print(f"[POOL] Worker {os.getpid()} sin catálogo precargado: {e}")
+
+
+def _ping():
+    return os.getpid()
+
+
+class SolverPool:
+    """
+    Envoltorio de ProcessPoolExecutor con cola acotada.
+    Se usa desde el event loop de FastAPI (un solo hilo), así que los
+    contadores no necesitan lock.
+    """
+
+    def __init__(self, n_workers=N_WORKERS, max_cola=MAX_COLA, retry_after=RETRY_AFTER_S):
+        self.n_workers = max(1, n_workers)
+        self.max_cola = max_cola
+        self.retry_after = retry_after
+        self._executor = None
+        self._cancelaciones = None
+        # Una ranura por tarea admitida (en ejecución + en cola)
+        self._ranuras_libres = list(range(self.n_workers + self.max_cola))
+        self._cancelada_en = {}  # ranura -> instante de la cancelación
+        self.en_curso = 0  # en ejecución + esperando worker (incluye canceladas que aún no han parado)
+        self.completadas = 0
+        self.rechazadas = 0
+        self.errores = 0
+        self.canceladas = 0
+        self.segundos_cancelados = 0.0  # solver gastado en respuestas que nadie recogió
+        self.segundos_hasta_parar = 0.0  # de la cancelación a que el worker quedó libre
+
+    def arrancar(self):
+        # spawn: mismo comportamiento en Linux y Windows y sin heredar hilos/locks del padre
+        ctx = multiprocessing.get_context("spawn")
+        if self._cancelaciones is None:
+            self._cancelaciones = ctx.Array("b", self.n_workers + self.max_cola, lock=False)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(self._cancelaciones,),
+        )
+
+    async def calentar(self):
+        """Fuerza el arranque de todos los workers (y su precarga de catálogo)."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self._executor, _ping)
+                               for _ in range(self.n_workers)])
+
+    def parar(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def en_cola(self):
+        return max(0, self.en_curso - self.n_workers)
+
+    async def ejecutar(self, fn, *args, **kwargs):
+        if self._executor is None:
+            self.arrancar()
+        if self.en_cola >= self.max_cola or not self._ranuras_libres:
+            self.rechazadas += 1
+            raise PoolSaturado(self.retry_after)
+
+        loop = asyncio.get_running_loop()
+        ranura = self._ranuras_libres.pop()
+        self._cancelaciones[ranura] = 0
+        self.en_curso += 1
+        inicio = time.monotonic()
+        futuro = None
+        try:
+            futuro = self._executor.submit(_en_ranura, ranura, fn, args, kwargs)
+            # La ranura (y el hueco en en_curso) se libera cuando el worker termina de
+            # verdad, no cuando deja de esperarse: una cancelada sigue ocupándolo hasta parar
+            futuro.add_done_callback(lambda _: self._al_terminar(loop, ranura))
+            resultado = await asyncio.wrap_future(futuro)
+            self.completadas += 1
+            return resultado
+        except asyncio.CancelledError:
+            self._cancelaciones[ranura] = 1
+            self._cancelada_en[ranura] = time.monotonic()
+            self.canceladas += 1
+            espera = time.monotonic() - inicio
+            self.segundos_cancelados += espera
+            print(f"[POOL] {fn.__name__} cancelada tras {espera:.2f}s (cliente desconectado)")
+            raise
+        except BrokenProcessPool:
+            # Un worker murió (OOM, segfault del solver...): se recrea el pool
+            self.errores += 1
+            print("[POOL] Pool roto, recreando workers")
+            self.parar()
+            self.arrancar()
+            raise PoolSaturado(self.retry_after)
+        except Exception:
+            self.errores += 1
+            raise
+        finally:
+            if futuro is None:  # ni llegó a enviarse
+                self._liberar(ranura)
+
+    def _al_terminar(self, loop, ranura):
+        # Hilo del executor → de vuelta al event loop (los contadores no llevan lock)
+        try:
+            loop.call_soon_threadsafe(self._liberar, ranura)
+        except RuntimeError:
+            pass  # loop ya cerrado (apagado de la API)
+
+    def _liberar(self, ranura):
+        cancelada_en = self._cancelada_en.pop(ranura, None)
+        if cancelada_en is not None:
+            # Lo que tardó el worker en enterarse y soltar el solver
+            parada = time.monotonic() - cancelada_en
+            self.segundos_hasta_parar += parada
+            print(f"[POOL] Worker libre {parada:.2f}s después de cancelar")
+        self._ranuras_libres.append(ranura)
+        self.en_curso -= 1
+
+    def metricas(self):
+        return {
+            "workers": self.n_workers,
+            "en_curso": self.en_curso,
+            "en_cola": self.en_cola,
+            "max_cola": self.max_cola,
+            "completadas": self.completadas,
+            "rechazadas": self.rechazadas,
+            "errores": self.errores,
+            "canceladas": self.canceladas,
+            "segundos_cancelados": round(self.segundos_cancelados, 2),
+            "segundos_hasta_parar": round(self.segundos_hasta_parar, 2),
+        }
+
+
+solver_pool = SolverPool()
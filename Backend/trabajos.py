@@ -0,0 +1,246 @@
+"""
+Trabajos asíncronos de optimización (cola duradera en Postgres).
+- POST /optimizar/jobs inserta la petición (ya canónica, con sus MIP start)
+  en trabajos_optimizacion y devuelve el id al momento
+- Los workers (este script, tantos procesos/máquinas como haga falta,
+  independientes de la API) reclaman trabajos con FOR UPDATE SKIP LOCKED
+  y guardan el resultado de generar_propuestas_api en la misma fila
+- Un trabajo 'en_curso' cuyo worker murió vuelve a reclamarse pasado
+  TRABAJO_VISIBILIDAD_S (hasta TRABAJO_MAX_INTENTOS veces): reiniciar
+  API o workers no pierde nada de lo encolado
+- La primera lectura del resultado lo guarda en caché y en una sesión y
+  apunta su sesion_id en la fila: las siguientes lecturas no escriben nada
+- Los trabajos terminados se borran pasadas TRABAJO_RETENCION_H horas
+USO: python Backend/trabajos.py [--procesos N]
+"""
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import uuid
+
+from sqlalchemy import text
+
+from catalogo import get_engine
+
+# Tiempo sin terminar tras el que un trabajo 'en_curso' se da por abandonado
+# (muy por encima de TIEMPO_MAX_S: el solver ya corta antes)
+TRABAJO_VISIBILIDAD_S = int(os.environ.get("TRABAJO_VISIBILIDAD_S", "120"))
+TRABAJO_MAX_INTENTOS = int(os.environ.get("TRABAJO_MAX_INTENTOS", "3"))
+TRABAJO_ESPERA_S = float(os.environ.get("TRABAJO_ESPERA_S", "0.5"))
+TRABAJO_RETENCION_H = int(os.environ.get("TRABAJO_RETENCION_H", "24"))
+
+SQL_CREAR = """
+    CREATE TABLE IF NOT EXISTS trabajos_optimizacion (
+        id VARCHAR(32) PRIMARY KEY,
+        estado VARCHAR(12) NOT NULL DEFAULT 'pendiente',
+        peticion JSONB NOT NULL,
+        resultado JSONB,
+        error TEXT,
+        catalogo_version TEXT,
+        intentos INTEGER NOT NULL DEFAULT 0,
+        worker TEXT,
+        creado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        empezado_en TIMESTAMP,
+        terminado_en TIMESTAMP,
+        sesion_id VARCHAR(32)
+    );
+    ALTER TABLE trabajos_optimizacion ADD COLUMN IF NOT EXISTS sesion_id VARCHAR(32);
+    CREATE INDEX IF NOT EXISTS idx_trabajos_cola ON trabajos_optimizacion (creado_en)
+        WHERE estado IN ('pendiente', 'en_curso');
+"""
+
+SQL_RECLAMAR = """
+    UPDATE trabajos_optimizacion
+    SET estado = 'en_curso', intentos = intentos + 1, worker = :w, empezado_en = CURRENT_TIMESTAMP
+    WHERE id = (
+        SELECT id FROM trabajos_optimizacion
+        WHERE estado = 'pendiente'
+           OR (estado = 'en_curso' AND empezado_en < CURRENT_TIMESTAMP - make_interval(secs => :vis))
+        ORDER BY creado_en
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, peticion, intentos
+"""
+
+_tabla_creada = False
+
+
+def _preparar(engine):
+    global _tabla_creada
+    if not _tabla_creada:
+        with engine.begin() as conn:
+            conn.execute(text(SQL_CREAR))
+        _tabla_creada = True
+
+
+def _json(datos):
+    return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+# =====================================================================
+# LADO API
+# =====================================================================
+def encolar(peticion, engine=None):
+    """Encola los kwargs de generar_propuestas_api. Devuelve el id del trabajo."""
+    engine = engine or get_engine()
+    _preparar(engine)
+    trabajo_id = uuid.uuid4().hex
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO trabajos_optimizacion (id, peticion) VALUES (:id, CAST(:p AS JSONB))"),
+                     {"id": trabajo_id, "p": _json(peticion)})
+    return trabajo_id
+
+
+def registrar_hecho(peticion, resultado, engine=None):
+    """Trabajo que nace terminado (acierto de caché/rejilla): el cliente sondea igual."""
+    engine = engine or get_engine()
+    _preparar(engine)
+    trabajo_id = uuid.uuid4().hex
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO trabajos_optimizacion (id, estado, peticion, resultado, empezado_en, terminado_en)
+            VALUES (:id, 'hecho', CAST(:p AS JSONB), CAST(:r AS JSONB), CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        """), {"id": trabajo_id, "p": _json(peticion), "r": _json(resultado)})
+    return trabajo_id
+
+
+def consultar(trabajo_id, engine=None):
+    """Estado del trabajo (con resultado o error si terminó), o None si no existe."""
+    engine = engine or get_engine()
+    _preparar(engine)
+    with engine.connect() as conn:
+        fila = conn.execute(text("""
+            SELECT id, estado, peticion, resultado, error, catalogo_version, intentos,
+                   creado_en, empezado_en, terminado_en, sesion_id
+            FROM trabajos_optimizacion WHERE id = :id
+        """), {"id": trabajo_id}).mappings().fetchone()
+    return dict(fila) if fila else None
+
+
+def consumir(trabajo_id, crear_sesion, engine=None):
+    """
+    Apunta en un trabajo terminado la sesión de su primera lectura.
+    crear_sesion() solo se llama si nadie lo había leído aún, con la fila
+    bloqueada (FOR UPDATE): con dos sondeos a la vez solo uno crea la sesión,
+    el otro espera al primero y recibe su id.
+    Devuelve (sesion_id, True si esta lectura ha sido la primera).
+    """
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        sesion_id = conn.execute(text("SELECT sesion_id FROM trabajos_optimizacion WHERE id = :id FOR UPDATE"),
+                                 {"id": trabajo_id}).scalar()
+        if sesion_id is not None:
+            return sesion_id, False
+        sesion_id = crear_sesion()
+        conn.execute(text("UPDATE trabajos_optimizacion SET sesion_id = :s WHERE id = :id"),
+                     {"s": sesion_id, "id": trabajo_id})
+        return sesion_id, True
+
+
+def posicion_en_cola(trabajo_id, engine=None):
+    """Trabajos pendientes por delante de este."""
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT COUNT(*) FROM trabajos_optimizacion
+            WHERE estado = 'pendiente'
+              AND creado_en < (SELECT creado_en FROM trabajos_optimizacion WHERE id = :id)
+        """), {"id": trabajo_id}).scalar()
+
+
+# =====================================================================
+# LADO WORKER
+# =====================================================================
+def reclamar(worker, engine):
+    """Marca como 'en_curso' el trabajo más antiguo disponible y lo devuelve, o None."""
+    with engine.begin() as conn:
+        return conn.execute(text(SQL_RECLAMAR), {"w": worker, "vis": TRABAJO_VISIBILIDAD_S}).fetchone()
+
+
+def _terminar(engine, trabajo_id, worker, resultado=None, error=None, version=None):
+    # Solo si sigue siendo nuestro: si se dio por abandonado y otro worker lo
+    # reclamó, manda el resultado de ese
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE trabajos_optimizacion
+            SET estado = :e, resultado = CAST(:r AS JSONB), error = :err, catalogo_version = :v,
+                terminado_en = CURRENT_TIMESTAMP
+            WHERE id = :id AND worker = :w AND estado = 'en_curso'
+        """), {"e": "error" if error else "hecho", "r": _json(resultado) if resultado is not None else None,
+               "err": error, "v": version, "id": trabajo_id, "w": worker})
+
+
+def _purgar(engine):
+    with engine.begin() as conn:
+        borrados = conn.execute(text("""
+            DELETE FROM trabajos_optimizacion
+            WHERE estado IN ('hecho', 'error')
+              AND terminado_en < CURRENT_TIMESTAMP - make_interval(hours => :h)
+        """), {"h": TRABAJO_RETENCION_H}).rowcount
+    if borrados:
+        print(f"[JOBS] {borrados} trabajos antiguos borrados")
+
+
+def trabajar(engine=None, max_trabajos=None):
+    """Bucle de un worker: reclama, resuelve y guarda hasta max_trabajos (None = siempre)."""
+    from optimizer_logic import generar_propuestas_api
+
+    engine = engine or get_engine()
+    _preparar(engine)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"[JOBS] Worker {worker} esperando trabajos")
+    hechos, ultima_purga = 0, 0.0
+    while max_trabajos is None or hechos < max_trabajos:
+        if time.time() - ultima_purga > 3600:
+            _purgar(engine)
+            ultima_purga = time.time()
+        fila = reclamar(worker, engine)
+        if fila is None:
+            time.sleep(TRABAJO_ESPERA_S)
+            continue
+        trabajo_id, peticion, intentos = fila
+        if isinstance(peticion, str):
+            peticion = json.loads(peticion)
+        if intentos > TRABAJO_MAX_INTENTOS:
+            # Se ha llevado por delante a varios workers: no se reintenta más
+            _terminar(engine, trabajo_id, worker, error=f"Abandonado tras {intentos - 1} intentos")
+            continue
+        t0 = time.perf_counter()
+        try:
+            resultado = generar_propuestas_api(**peticion)
+            version = resultado.pop("_catalogo_version", None)
+            resultado.pop("_metricas", None)
+            if "error" in resultado:
+                _terminar(engine, trabajo_id, worker, error=resultado["error"], version=version)
+            else:
+                _terminar(engine, trabajo_id, worker, resultado=resultado, version=version)
+        except Exception as e:
+            print(f"[JOBS] Trabajo {trabajo_id} falló: {e}")
+            _terminar(engine, trabajo_id, worker, error=str(e))
+        hechos += 1
+        print(f"[JOBS] Trabajo {trabajo_id} terminado en {time.perf_counter() - t0:.2f}s (intento {intentos})")
+    return hechos
+
+
+def _proceso_worker():
+    try:
+        trabajar()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[sys.argv.index("--procesos") + 1]) if "--procesos" in sys.argv else 1
+    if n == 1:
+        _proceso_worker()
+    else:
+        ctx = multiprocessing.get_context("spawn")
+        procesos = [ctx.Process(target=_proceso_worker) for _ in range(n)]
+        for p in procesos:
+            p.start()
+        for p in procesos:
+            p.join()
@@ -0,0 +1,148 @@
+"""
+Benchmark: carga del catálogo desde Postgres (arranque de cada worker).
+Compara sobre un catálogo sintético (por defecto 50k productos):
+- pandas: pd.read_sql + to_dict('records') + un dict preparado por producto
+  (la carga original)
+- dicts: filas como dicts sin pandas, preparadas y compactadas después
+- streaming: cursor de servidor por lotes volcado directamente a la tabla
+  columnar (catalogo.cargar_productos)
+Mide tiempo (sin tracemalloc), pico y memoria retenida (con tracemalloc) y
+el coste de importar pandas. El catálogo se carga en un esquema aparte
+(bench_carga) de la BBDD indicada, que se borra al terminar.
+USO: python Benchmarks/bench_carga.py [n_productos] [--url postgresql://...]
+"""
+import gc
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Backend")
+sys.path.append(BACKEND)
+
+from sqlalchemy import create_engine, text
+
+from catalogo import cargar_productos, compactar
+from catalogo_sintetico import generar_filas
+from fuentes_catalogo import DATABASE_URL, QUERY_PRODUCTOS, FuentePostgres
+
+ESQUEMA = "bench_carga"
+REPETICIONES = 3
+
+
+def _poblar(engine, n):
+    """productos_v2 + categorias + nutricion con el catálogo sintético, en ESQUEMA."""
+    filas = generar_filas(n)
+    tipos = sorted({f['tipo'] for f in filas})
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {ESQUEMA}"))
+        conn.execute(text("CREATE TABLE categorias (id SERIAL PRIMARY KEY, tipo TEXT, emoji TEXT)"))
+        conn.execute(text("""
+            CREATE TABLE productos_v2 (id INTEGER PRIMARY KEY, nombre TEXT, precio DOUBLE PRECISION,
+                peso_gramos DOUBLE PRECISION, imagen_url TEXT, categoria_id INTEGER, momentos TEXT[])
+        """))
+        conn.execute(text("""
+            CREATE TABLE nutricion (id SERIAL PRIMARY KEY, producto_id INTEGER,
+                proteinas_100g DOUBLE PRECISION, carbohidratos_100g DOUBLE PRECISION,
+                grasas_100g DOUBLE PRECISION, calorias_100g DOUBLE PRECISION)
+        """))
+        conn.execute(text("INSERT INTO categorias (tipo, emoji) VALUES (:tipo, :emoji)"),
+                     [{"tipo": t, "emoji": next(f['emoji'] for f in filas if f['tipo'] == t)} for t in tipos])
+        categoria = {t: i + 1 for i, t in enumerate(tipos)}
+        conn.execute(text("""
+            INSERT INTO productos_v2 VALUES (:id, :nombre, :precio, :peso_gramos, :imagen_url, :cat, :momentos)
+        """), [{**f, "cat": categoria[f['tipo']]} for f in filas])
+        conn.execute(text("""
+            INSERT INTO nutricion (producto_id, proteinas_100g, carbohidratos_100g, grasas_100g, calorias_100g)
+            VALUES (:id, :proteinas_100g, :carbohidratos_100g, :grasas_100g, :calorias_100g)
+        """), filas)
+
+
+def _preparar_dicts(productos):
+    """La preparación original: un dict por producto con las macros por pack añadidas."""
+    for p in productos:
+        factor = max(float(p.get('peso_gramos', 100) or 100), 1) / 100.0
+        p['prot_pack'] = (p.get('proteinas_100g') or 0) * factor
+        p['kcal_pack'] = (p.get('calorias_100g') or 0) * factor
+        p['gras_pack'] = (p.get('grasas_100g') or 0) * factor
+        p['carb_pack'] = (p.get('carbohidratos_100g') or 0) * factor
+        p['precio'] = float(p['precio'])
+        p['comidas'] = p.get('momentos') or ['comida', 'cena']
+    return productos
+
+
+def cargar_pandas(engine):
+    import pandas as pd
+    productos = _preparar_dicts(pd.read_sql(QUERY_PRODUCTOS, engine).to_dict('records'))
+    return compactar(productos)
+
+
+def cargar_dicts(engine):
+    with engine.connect() as conn:
+        productos = [dict(f) for f in conn.execute(text(QUERY_PRODUCTOS)).mappings()]
+    return compactar(_preparar_dicts(productos))
+
+
+def _medir(cargar):
+    """(segundos mejor de REPETICIONES, pico MB, retenido MB)."""
+    tiempos = []
+    for _ in range(REPETICIONES):
+        gc.collect()
+        t0 = time.perf_counter()
+        cargar()
+        tiempos.append(time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    vista = cargar()
+    gc.collect()
+    retenido, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del vista
+    return min(tiempos), pico / 1e6, retenido / 1e6
+
+
+def _importar(modulo):
+    """Segundos de `import modulo` en un intérprete nuevo (menos el intérprete vacío)."""
+    def medir(codigo):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", codigo], check=True, cwd=BACKEND)
+        return time.perf_counter() - t0
+    vacio = min(medir("pass") for _ in range(3))
+    return min(medir(f"import {modulo}") for _ in range(3)) - vacio
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    url = DATABASE_URL
+    if "--url" in args:
+        url = args.pop(args.index("--url") + 1)
+        args.remove("--url")
+    n = int(args[0]) if args else 50000
+
+    # search_path en la URL: lo usan tanto este engine como el de FuentePostgres
+    url += ("&" if "?" in url else "?") + f"options=-csearch_path%3D{ESQUEMA}"
+    engine = create_engine(url)
+    try:
+        print(f"Poblando {n} productos en el esquema {ESQUEMA}...")
+        _poblar(engine, n)
+        fuente = FuentePostgres(url)
+
+        print(f"\n📊 Carga del catálogo | {n} productos | mejor de {REPETICIONES}")
+        print(f"   {'camino':10s} {'tiempo (s)':>11s} {'pico (MB)':>10s} {'retenido (MB)':>14s}")
+        for nombre, cargar in [("pandas", lambda: cargar_pandas(engine)),
+                               ("dicts", lambda: cargar_dicts(engine)),
+                               ("streaming", lambda: cargar_productos(fuente))]:
+            segundos, pico, retenido = _medir(cargar)
+            print(f"   {nombre:10s} {segundos:11.2f} {pico:10.1f} {retenido:14.1f}")
+
+        print("\n📊 Importar en un proceso nuevo (arranque de worker)")
+        for modulo in ("pandas", "catalogo", "optimizer_logic"):
+            print(f"   import {modulo:16s} {_importar(modulo) * 1000:7.0f} ms")
+        print("   pandas cargado tras import optimizer_logic:",
+              subprocess.run([sys.executable, "-c", "import optimizer_logic, sys; print('pandas' in sys.modules)"],
+                             capture_output=True, text=True, cwd=BACKEND).stdout.strip())
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE"))
@@ -0,0 +1,55 @@
+"""
+Benchmark: construcción del modelo según el tamaño del catálogo.
+El catálogo real se replica ×1, ×10 y ×100 (nombres y safe_id únicos,
+precio con ±20% de ruido) y se mide cada fase de PlantillaModelo:
+arrays de productos, presolve y matriz dispersa.
+USO: python Benchmarks/bench_construccion.py [factor_max]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Backend"))
+
+from catalogo import cargar_productos, compactar
+from optimizer_logic import ColumnasProductos, PlantillaModelo, presolve_estatico
+
+FACTORES = [1, 10, 100]
+
+
+def _replicar(productos, factor, semilla=0):
+    rnd = random.Random(semilla)
+    replicados = []
+    for r in range(factor):
+        for p in productos:
+            q = dict(p)
+            if r:
+                q['nombre'] = f"{p['nombre']} #{r}"
+                q['precio'] = round(p['precio'] * rnd.uniform(0.8, 1.2), 2)
+            replicados.append(q)
+    return compactar(replicados)
+
+
+def bench(productos, factor_max):
+    print(f"\n{'='*78}")
+    print(f"📊 Construcción del modelo | catálogo base {len(productos)} prods")
+    print(f"{'='*78}")
+    print(f"   {'productos':>10s} {'arrays (ms)':>12s} {'presolve (ms)':>14s} "
+          f"{'total (ms)':>11s} {'columnas':>9s} {'nnz':>9s}")
+    for factor in [f for f in FACTORES if f <= factor_max]:
+        prods = _replicar(productos, factor)
+        t0 = time.perf_counter()
+        cols = ColumnasProductos(prods)
+        t1 = time.perf_counter()
+        presolve_estatico(cols)
+        t2 = time.perf_counter()
+        plantilla = PlantillaModelo(prods)
+        t3 = time.perf_counter()
+        print(f"   {len(prods):10d} {(t1 - t0) * 1000:12.1f} {(t2 - t1) * 1000:14.1f} "
+              f"{(t3 - t2) * 1000:11.1f} {plantilla.n_columnas:9d} {len(plantilla.a_valor):9d}")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    bench(cargar_productos(), n)
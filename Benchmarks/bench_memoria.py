@@ -0,0 +1,79 @@
+"""
+Benchmark: memoria del catálogo en proceso (lo que tiene cada worker).
+Compara la representación antigua (un dict por producto con ~17 claves y
+listas copiadas por filtro de tipos) con la columnar (TablaProductos +
+vistas de índices). Se carga desde un CSV exportado para que cada producto
+tenga sus propios strings, como al leer de BBDD.
+USO: python Benchmarks/bench_memoria.py [n_productos ...]
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Backend"))
+
+from catalogo import CatalogoSnapshot, cargar_productos
+from catalogo_sintetico import generar_filas
+from fuentes_catalogo import FuenteCSV, exportar
+
+TAMANOS = [10000, 100000]
+FILTROS = [["capricho"], ["carne", "pescado"], ["carne", "pescado", "lacteo", "huevo"]]
+
+
+def _preparar_dicts(productos):
+    """Lo que hacía cargar_productos antes del catálogo columnar."""
+    for i, p in enumerate(productos):
+        p['safe_id'] = i
+        factor = max(float(p.get('peso_gramos', 100) or 100), 1) / 100.0
+        p['prot_pack'] = (p.get('proteinas_100g') or 0) * factor
+        p['kcal_pack'] = (p.get('calorias_100g') or 0) * factor
+        p['gras_pack'] = (p.get('grasas_100g') or 0) * factor
+        p['carb_pack'] = (p.get('carbohidratos_100g') or 0) * factor
+        p['precio'] = float(p['precio'])
+        p['comidas'] = p.get('momentos') or ['comida', 'cena']
+    return productos
+
+
+def _medir(construir):
+    """(objeto, bytes que siguen vivos, pico de bytes, segundos)."""
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    objeto = construir()
+    segundos = time.perf_counter() - t0
+    gc.collect()
+    vivos, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objeto, vivos, pico, segundos
+
+
+def bench(n, ruta):
+    fuente = FuenteCSV(ruta)
+
+    dicts, d_vivos, d_pico, d_s = _medir(lambda: _preparar_dicts(fuente.productos()))
+    _, d_vistas, _, _ = _medir(lambda: [[p for p in dicts if p['tipo'] not in set(f)] for f in FILTROS])
+    del dicts
+
+    vista, c_vivos, c_pico, c_s = _medir(lambda: cargar_productos(fuente))
+    snap = CatalogoSnapshot("bench", vista)
+    _, c_vistas, _, _ = _medir(lambda: [snap.vista(f) for f in FILTROS])
+
+    print(f"\n📊 {n} productos (+{len(FILTROS)} vistas por excluir_tipos)")
+    print(f"   {'':10s} {'B/producto':>11s} {'vistas B/prod':>14s} {'total MB':>9s} {'pico MB':>8s} {'carga (s)':>10s}")
+    for nombre, vivos, vistas, pico, s in [("dicts", d_vivos, d_vistas, d_pico, d_s),
+                                           ("columnar", c_vivos, c_vistas, c_pico, c_s)]:
+        print(f"   {nombre:10s} {vivos / n:11.0f} {vistas / n:14.1f} {(vivos + vistas) / 1e6:9.1f} "
+              f"{pico / 1e6:8.1f} {s:10.2f}")
+    print(f"   TablaProductos.nbytes: {vista.tabla.nbytes / n:.0f} B/producto")
+
+
+if __name__ == "__main__":
+    tamanos = [int(a) for a in sys.argv[1:]] or TAMANOS
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in tamanos:
+            ruta = os.path.join(tmp, f"catalogo_{n}.csv")
+            exportar(generar_filas(n), ruta)
+            bench(n, ruta)
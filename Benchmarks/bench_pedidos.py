@@ -0,0 +1,211 @@
+"""
+Benchmark: historial de pedidos (GET /pedidos) de un usuario con muchos pedidos.
+Compara, con la latencia p50/p95 de N_PETICIONES llamadas:
+- antes: todos los pedidos con su secciones_json, sin límite (listado original)
+- keyset: primera página y una página profunda (cursor) de listar_pedidos
+- offset: la misma página profunda con LIMIT/OFFSET, como referencia
+- detalle: GET /pedidos/{id}
+- analítica (top productos, gasto por tipo y mes): decodificando todos los
+  secciones_json en Python frente a SQL sobre pedido_items (tras backfill)
+- /pedidos/stats: tendencia semanal leyendo pedidos_semana frente a
+  reagregar todo el historial del usuario en cada petición
+- POST /pedidos: alta de un pedido con sus líneas y su agregado semanal
+  (y que los agregados incrementales cuadran con reconstruirlos)
+Crea usuarios, productos_v2 y pedidos (con _init_db, índices incluidos) en
+un esquema aparte (bench_pedidos) de la BBDD indicada, que se borra al terminar.
+USO: python Benchmarks/bench_pedidos.py [n_pedidos] [--url postgresql://...]
+"""
+import json
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Backend"))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from catalogo_sintetico import productos_base
+from fuentes_catalogo import DATABASE_URL
+import pedidos
+from main import _init_db, crear_pedido, listar_pedidos, obtener_pedido
+from models import PedidoRequest
+
+ESQUEMA = "bench_pedidos"
+N_PETICIONES = 200
+PAGINA_PROFUNDA = 250
+
+
+def _cesta(rng, base):
+    """secciones_json como lo devuelve el optimizador: ~20 productos en 4 comidas, "Nombre (xN)" con N > 1."""
+    cesta = {}
+    for seccion in ("desayuno", "comida", "merienda", "cena"):
+        cesta[seccion] = []
+        for p in rng.sample(base, rng.randint(3, 7)):
+            qty = rng.choice((1, 1, 1, 2, 3))
+            cesta[seccion].append({"nombre": p["nombre"] + (f" (x{qty})" if qty > 1 else ""),
+                                   "precio": round(float(p["precio"]) * qty, 2), "tipo": p["tipo"],
+                                   "emoji": p["emoji"], "kcal_pack": 100.0 * qty})
+    return cesta
+
+
+def _poblar(engine, n):
+    rng = random.Random(42)
+    base = productos_base()
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {ESQUEMA}"))
+        conn.execute(text("CREATE TABLE usuarios (id SERIAL PRIMARY KEY, email TEXT)"))
+        conn.execute(text("INSERT INTO usuarios (email) VALUES ('bench@pedidos'), ('otro@pedidos')"))
+        conn.execute(text("CREATE TABLE productos_v2 (id INTEGER PRIMARY KEY, nombre TEXT, precio DOUBLE PRECISION)"))
+        conn.execute(text("INSERT INTO productos_v2 VALUES (:id, :nombre, :precio)"), base)
+    _init_db(engine)
+    with engine.begin() as conn:
+        # Otro usuario con el mismo volumen: el índice tiene que separar a los dos
+        for uid in (1, 2):
+            conn.execute(text("""
+                INSERT INTO pedidos (usuario_id, fecha, precio_total, version_label, macros_json, secciones_json)
+                VALUES (:uid, now() - make_interval(hours => :i), :precio, 'A', :macros, :secciones)
+            """), [{"uid": uid, "i": i, "precio": round(rng.uniform(20, 120), 2),
+                    "macros": json.dumps({"kcal": rng.randint(10000, 20000), "prot": rng.randint(500, 1200)}),
+                    "secciones": json.dumps(_cesta(rng, base))} for i in range(n)])
+        conn.execute(text("ANALYZE pedidos"))
+
+
+def _top_json(db, uid, limite=10):
+    """Top productos como había que hacerlo antes: todos los JSON a Python."""
+    unidades, gasto = Counter(), defaultdict(float)
+    for (secciones,) in db.execute(text("SELECT secciones_json FROM pedidos WHERE usuario_id = :uid"), {"uid": uid}):
+        for items in secciones.values():
+            for item in items:
+                m = re.match(r"(.*) \(x(\d+)\)$", item["nombre"])
+                nombre, qty = (m.group(1), int(m.group(2))) if m else (item["nombre"], 1)
+                unidades[nombre] += qty
+                gasto[nombre] += item["precio"]
+    orden = sorted(unidades, key=lambda n: (-unidades[n], -gasto[n], n))
+    return [(n, unidades[n], round(gasto[n], 2)) for n in orden[:limite]]
+
+
+def _gasto_json(db, uid):
+    gasto = defaultdict(float)
+    for fecha, secciones in db.execute(text("SELECT fecha, secciones_json FROM pedidos WHERE usuario_id = :uid"),
+                                       {"uid": uid}):
+        for items in secciones.values():
+            for item in items:
+                gasto[(fecha.strftime("%Y-%m"), item.get("tipo"))] += item["precio"]
+    return sorted(gasto.items(), reverse=True)
+
+
+def _stats_pedidos(db, uid, semanas=26):
+    """Las mismas semanas que /pedidos/stats, agregando los pedidos (y su JSON) en cada petición."""
+    filtro = "usuario_id = :uid AND fecha >= date_trunc('week', CURRENT_TIMESTAMP) - make_interval(weeks => :n - 1)"
+    return db.execute(text(pedidos._AGREGADO_SEMANA.format(filtro=filtro)), {"uid": uid, "n": semanas}).fetchall()
+
+
+def _antes(db, uid):
+    """El listado original: todo el historial con la cesta completa."""
+    rows = db.execute(text("""
+        SELECT id, fecha, precio_total, version_label, macros_json, secciones_json
+        FROM pedidos WHERE usuario_id = :uid ORDER BY fecha DESC
+    """), {"uid": uid}).fetchall()
+    return [{"id": r[0], "fecha": r[1].isoformat(), "precio_total": float(r[2]), "version_label": r[3],
+             "macros_json": r[4], "secciones_json": r[5]} for r in rows]
+
+
+def _offset(db, uid, pagina, limite=20):
+    rows = db.execute(text("""
+        SELECT id, fecha, precio_total, version_label, macros_json
+        FROM pedidos WHERE usuario_id = :uid ORDER BY fecha DESC, id DESC LIMIT :n OFFSET :o
+    """), {"uid": uid, "n": limite, "o": pagina * limite}).fetchall()
+    return [{"id": r[0], "fecha": r[1].isoformat(), "precio_total": float(r[2]), "version_label": r[3],
+             "macros_json": r[4]} for r in rows]
+
+
+def _latencias(llamada, n=N_PETICIONES):
+    tiempos = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        respuesta = llamada()
+        tiempos.append(time.perf_counter() - t0)
+    tiempos.sort()
+    tamano = len(json.dumps(respuesta, default=str))
+    return tiempos[len(tiempos) // 2] * 1000, tiempos[int(len(tiempos) * 0.95) - 1] * 1000, tamano
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    url = DATABASE_URL
+    if "--url" in args:
+        url = args.pop(args.index("--url") + 1)
+        args.remove("--url")
+    n = int(args[0]) if args else 10000
+
+    url += ("&" if "?" in url else "?") + f"options=-csearch_path%3D{ESQUEMA}"
+    engine = create_engine(url)
+    db = None
+    try:
+        print(f"Poblando {n} pedidos por usuario en el esquema {ESQUEMA}...")
+        _poblar(engine, n)
+        db = sessionmaker(bind=engine)()
+
+        # Cursor de la página profunda siguiendo la paginación de verdad
+        cursor = None
+        for _ in range(min(PAGINA_PROFUNDA, n // 20 - 1)):
+            cursor = listar_pedidos(cursor=cursor, user_id=1, db=db)["siguiente"]
+        uno = listar_pedidos(user_id=1, db=db)["pedidos"][0]["id"]
+
+        print(f"\n📊 GET /pedidos | usuario con {n} pedidos | {N_PETICIONES} peticiones")
+        print(f"   {'caso':32s} {'p50 (ms)':>9s} {'p95 (ms)':>9s} {'respuesta':>12s}")
+        casos = [("antes (todo, con cesta)", lambda: _antes(db, 1), 20),
+                 ("keyset página 1", lambda: listar_pedidos(user_id=1, db=db), N_PETICIONES),
+                 (f"keyset página {PAGINA_PROFUNDA}", lambda: listar_pedidos(cursor=cursor, user_id=1, db=db),
+                  N_PETICIONES),
+                 (f"offset página {PAGINA_PROFUNDA}", lambda: _offset(db, 1, PAGINA_PROFUNDA), N_PETICIONES),
+                 ("detalle /pedidos/{id}", lambda: obtener_pedido(uno, user_id=1, db=db), N_PETICIONES)]
+        for nombre, llamada, repeticiones in casos:
+            p50, p95, tamano = _latencias(llamada, repeticiones)
+            print(f"   {nombre:32s} {p50:9.2f} {p95:9.2f} {tamano / 1024:9.0f} KB")
+        db.commit()
+
+        t0 = time.perf_counter()
+        lineas = pedidos.backfill(engine)
+        pedidos.reconstruir_semanas(engine)
+        print(f"\n📊 Analítica | backfill de {2 * n} pedidos: {lineas} líneas en {time.perf_counter() - t0:.1f}s")
+        comprobado = [(p["nombre"], p["unidades"], p["gasto"]) for p in pedidos.top_productos(db, 1)]
+        print(f"   top productos igual que desde el JSON: {comprobado == _top_json(db, 1)}")
+        print(f"   {'caso':32s} {'p50 (ms)':>9s} {'p95 (ms)':>9s} {'respuesta':>12s}")
+        cesta = PedidoRequest(precio_total=50, version_label="A", macros_json={"kcal": 2000},
+                              secciones_json=_cesta(random.Random(1), productos_base()))
+        casos = [("top productos (JSON en Python)", lambda: _top_json(db, 1), 10),
+                 ("top productos (pedido_items)", lambda: pedidos.top_productos(db, 1), N_PETICIONES),
+                 ("top productos 30 días", lambda: pedidos.top_productos(db, 1, dias=30), N_PETICIONES),
+                 ("gasto tipo/mes (JSON en Python)", lambda: _gasto_json(db, 1), 10),
+                 ("gasto tipo/mes (pedido_items)", lambda: pedidos.gasto_por_tipo_mes(db, 1), N_PETICIONES),
+                 ("POST /pedidos (con líneas)", lambda: crear_pedido(cesta, user_id=1, db=db), N_PETICIONES)]
+        for nombre, llamada, repeticiones in casos:
+            p50, p95, tamano = _latencias(llamada, repeticiones)
+            print(f"   {nombre:32s} {p50:9.2f} {p95:9.2f} {tamano / 1024:9.0f} KB")
+        db.commit()
+
+        print(f"\n📊 /pedidos/stats | 26 semanas")
+        casos = [("reagregando pedidos", lambda: _stats_pedidos(db, 1), 50),
+                 ("pedidos_semana", lambda: pedidos.stats_semanales(db, 1), N_PETICIONES)]
+        for nombre, llamada, repeticiones in casos:
+            p50, p95, tamano = _latencias(llamada, repeticiones)
+            print(f"   {nombre:32s} {p50:9.2f} {p95:9.2f} {tamano / 1024:9.0f} KB")
+        incremental = db.execute(text("SELECT * FROM pedidos_semana ORDER BY 1, 2")).fetchall()
+        db.commit()
+        pedidos.reconstruir_semanas(engine)
+        reconstruido = db.execute(text("SELECT * FROM pedidos_semana ORDER BY 1, 2")).fetchall()
+        iguales = len(incremental) == len(reconstruido) and all(
+            a[:4] == b[:4] and all(abs(x - y) < 1e-6 * max(1, abs(y)) for x, y in zip(a[4:], b[4:]))
+            for a, b in zip(incremental, reconstruido))
+        print(f"   agregados incrementales = reconstruidos: {iguales}")
+    finally:
+        if db is not None:
+            db.close()  # si no, el DROP espera a su transacción abierta
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {ESQUEMA} CASCADE"))
@@ -0,0 +1,147 @@
+"""
+Benchmark: construcción del modelo vs resolución.
+Compara el camino antiguo con la plantilla compilada una vez y parcheada
+por versión. El camino antiguo es el resolver_version de verdad de antes de
+la plantilla (optimizer_logic.py del padre del primer commit con
+PlantillaModelo, o de BENCH_BASELINE, leído con git show y cargado como
+módulo aparte): construye y resuelve un pulp.LpProblem nuevo
+por versión A/B/C.
+USO: python Benchmarks/bench_plantilla.py [n_peticiones]
+"""
+import contextlib
+import os
+import subprocess
+import sys
+import time
+import types
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(RAIZ, "Backend"))
+
+import pulp
+
+from catalogo import cargar_productos
+from optimizer_logic import PlantillaModelo
+
+# Ref con el optimizer_logic.py de antes de la plantilla. Por defecto se busca
+# en el historial (sin SHAs fijos, que dejan de existir al rebasar o squashear)
+BASELINE = os.environ.get("BENCH_BASELINE")
+
+PRESUPUESTOS = [30, 50, 60, 80, 120]
+PROT_SEM = 150 * 7
+KCAL_SEM = 2400 * 7
+
+
+def _git(*args):
+    return subprocess.run(["git", *args], cwd=RAIZ, capture_output=True, text=True)
+
+
+def _ref_baseline():
+    """BENCH_BASELINE, o el padre del primer commit que añadió PlantillaModelo."""
+    if BASELINE:
+        return BASELINE
+    commits = _git("log", "--reverse", "--format=%H", "-S", "class PlantillaModelo", "--",
+                   "Backend/optimizer_logic.py").stdout.split()
+    if not commits:
+        sys.exit("No se encuentra en git el commit que añadió PlantillaModelo "
+                 "(¿copia sin historial?): indica la ref del código antiguo con BENCH_BASELINE=<ref>")
+    return f"{commits[0]}^"
+
+
+def _modulo_baseline(ref):
+    """optimizer_logic.py tal como estaba en `ref`, cargado sin pisar el módulo actual."""
+    ruta = f"{ref}:Backend/optimizer_logic.py"
+    salida = _git("show", ruta)
+    if salida.returncode != 0:
+        sys.exit(f"No se puede leer {ruta} ({salida.stderr.strip()}): "
+                 "indica la ref del código antiguo con BENCH_BASELINE=<ref>")
+    fuente = salida.stdout
+    modulo = types.ModuleType("optimizer_logic_baseline")
+    exec(compile(fuente, ruta, "exec"), modulo.__dict__)
+    return modulo
+
+
+@contextlib.contextmanager
+def _cronometrar_solve(tiempos):
+    """Suma a tiempos["solve"] lo que pasa dentro de LpProblem.solve (CBC incluido)."""
+    original = pulp.LpProblem.solve
+
+    def solve(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            tiempos["solve"] += time.perf_counter() - t0
+
+    pulp.LpProblem.solve = solve
+    try:
+        yield
+    finally:
+        pulp.LpProblem.solve = original
+
+
+def _versiones_baseline(baseline, productos, presupuesto, tiempos):
+    """A/B/C como el generar_propuestas_api antiguo: un resolver_version completo por versión."""
+    penalizar = set()
+    for version in "ABC":
+        solve_antes = tiempos["solve"]
+        t0 = time.perf_counter()
+        with _cronometrar_solve(tiempos):
+            v = baseline.resolver_version(productos, presupuesto, PROT_SEM, KCAL_SEM,
+                                          penalizar_ids=penalizar, version_name=version)
+        tiempos["build"] += time.perf_counter() - t0 - (tiempos["solve"] - solve_antes)
+        penalizar = penalizar | set(v.get("_ids_usados", []))
+
+
+def _versiones(plantilla_para, presupuesto, tiempos):
+    """Resuelve A/B/C; plantilla_para() devuelve la plantilla a usar en cada versión."""
+    penalizar = set()
+    for version in "ABC":
+        t0 = time.perf_counter()
+        plantilla = plantilla_para()
+        plantilla.parchear(presupuesto, PROT_SEM, KCAL_SEM, penalizar=penalizar, version_name=version)
+        t1 = time.perf_counter()
+        status = plantilla.resolver()
+        t2 = time.perf_counter()
+        tiempos["build"] += t1 - t0
+        tiempos["solve"] += t2 - t1
+        if status == 'Optimal':
+            penalizar |= set(plantilla.extraer(version)["_ids_usados"])
+
+
+def bench(productos, n_peticiones):
+    resultados = {}
+
+    # --- Camino antiguo: resolver_version de antes de la plantilla, un modelo nuevo por versión ---
+    ref = _ref_baseline()
+    baseline = _modulo_baseline(ref)
+    tiempos = {"build": 0.0, "solve": 0.0}
+    for i in range(n_peticiones):
+        _versiones_baseline(baseline, productos, PRESUPUESTOS[i % len(PRESUPUESTOS)], tiempos)
+    resultados["baseline"] = tiempos
+
+    # --- Plantilla: compilada una vez, parcheada por versión ---
+    tiempos = {"build": 0.0, "solve": 0.0}
+    t0 = time.perf_counter()
+    plantilla = PlantillaModelo(productos)
+    compilacion = time.perf_counter() - t0
+    for i in range(n_peticiones):
+        _versiones(lambda: plantilla, PRESUPUESTOS[i % len(PRESUPUESTOS)], tiempos)
+    resultados["plantilla"] = tiempos
+
+    n_solves = n_peticiones * 3
+    print(f"\n{'='*60}")
+    print(f"📊 {len(productos)} productos | {n_peticiones} peticiones ({n_solves} solves)")
+    print(f"   Baseline: optimizer_logic.py de {ref}")
+    print(f"   Compilación única de la plantilla: {compilacion * 1000:.1f} ms")
+    print(f"{'='*60}")
+    print(f"   {'camino':12s} {'build/solve (ms)':>18s} {'solve/solve (ms)':>18s} {'% build':>8s}")
+    for camino, t in resultados.items():
+        total = t["build"] + t["solve"]
+        print(f"   {camino:12s} {t['build'] / n_solves * 1000:18.1f} "
+              f"{t['solve'] / n_solves * 1000:18.1f} {t['build'] / total * 100:7.1f}%")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    bench(cargar_productos(), n)
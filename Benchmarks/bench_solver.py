@@ -0,0 +1,96 @@
+"""
+Benchmark: backends de solver (CBC subproceso vs HiGHS en proceso).
+- Overhead por solve = tiempo de pared - tiempo que el solver reporta haber
+  resuelto (ficheros, subproceso, paso del modelo y lectura de la solución)
+- Se mide sobre un modelo mínimo (pocos productos) y sobre el catálogo entero
+USO: python Benchmarks/bench_solver.py [n_repeticiones]
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Backend"))
+
+import numpy as np
+
+from catalogo import cargar_productos
+from optimizer_logic import BACKENDS, PlantillaModelo, highspy
+
+PRESUPUESTOS = [30, 50, 80]
+PROT_SEM = 150 * 7
+KCAL_SEM = 2400 * 7
+
+
+def _catalogo_minimo(productos, por_tipo=4):
+    """Unos pocos productos baratos por tipo: el MILP se resuelve en ~0 ms."""
+    elegidos, cuenta = np.zeros(len(productos), dtype=bool), {}
+    for k in np.argsort(productos.columna('precio'), kind='stable'):
+        tipo = productos[k]['tipo']
+        if cuenta.get(tipo, 0) < por_tipo:
+            cuenta[tipo] = cuenta.get(tipo, 0) + 1
+            elegidos[k] = True
+    return productos.filtrar(elegidos)
+
+
+def _solve_cbc(plantilla):
+    """(status, segundos dentro de CBC) leyendo el log del propio CBC."""
+    with tempfile.TemporaryDirectory() as tmp:
+        log = os.path.join(tmp, "cbc.log")
+        status = BACKENDS["cbc"].resolver(plantilla, log_path=log)
+        with open(log) as f:
+            relojes = re.findall(r"Wallclock seconds\):\s*([\d.]+)", f.read())
+    return status, float(relojes[-1]) if relojes else 0.0
+
+
+def _solve_highs(plantilla):
+    antes = plantilla.highs.getRunTime() if plantilla.highs else 0.0
+    status = BACKENDS["highs"].resolver(plantilla)
+    return status, plantilla.highs.getRunTime() - antes
+
+
+def _medir(nombre, productos, presupuestos, repeticiones):
+    solve = _solve_cbc if nombre == "cbc" else _solve_highs
+    plantilla = PlantillaModelo(productos)
+    tiempos, overheads, estados = [], [], {}
+    for _ in range(repeticiones):
+        for presupuesto in presupuestos:
+            penalizar = set()
+            for version in "ABC":
+                plantilla.parchear(presupuesto, PROT_SEM, KCAL_SEM, penalizar=penalizar, version_name=version)
+                t0 = time.perf_counter()
+                status, dentro = solve(plantilla)
+                pared = time.perf_counter() - t0
+                tiempos.append(pared)
+                overheads.append(pared - dentro)
+                estados[status] = estados.get(status, 0) + 1
+                if status == 'Optimal':
+                    penalizar |= set(plantilla.extraer(version)["_ids_usados"])
+    tiempos.sort()
+    return {
+        "media_ms": sum(tiempos) / len(tiempos) * 1000,
+        "p50_ms": tiempos[len(tiempos) // 2] * 1000,
+        "overhead_ms": sum(overheads) / len(overheads) * 1000,
+        "estados": estados,
+    }
+
+
+def bench(productos, repeticiones):
+    backends = [n for n in BACKENDS if n != "highs" or highspy is not None]
+    minimo = _catalogo_minimo(productos)
+
+    print(f"\n{'='*76}")
+    print(f"📊 Backends de solver | catálogo {len(productos)} prods | mínimo {len(minimo)} prods")
+    print(f"{'='*76}")
+    print(f"   {'backend':8s} {'modelo':8s} {'media (ms)':>11s} {'p50 (ms)':>10s} {'overhead (ms)':>14s}  estados")
+    for nombre in backends:
+        for etiqueta, prods, presupuestos in [("minimo", minimo, [30]), ("completo", productos, PRESUPUESTOS)]:
+            r = _medir(nombre, prods, presupuestos, repeticiones)
+            print(f"   {nombre:8s} {etiqueta:8s} {r['media_ms']:11.1f} {r['p50_ms']:10.1f} "
+                  f"{r['overhead_ms']:14.1f}  {r['estados']}")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    bench(cargar_productos(), n)
@@ -0,0 +1,172 @@
+"""
+Suite de benchmarks del optimizador sobre catálogos sintéticos
+(catalogo_sintetico.py: de 1k a 100k productos, sin BBDD).
+Rejilla tamaños × perfiles de PERFILES_DIETA (cada uno con sus
+excluir_tipos) × presupuestos. Por caso:
+- construccion_s: compilar la PlantillaModelo (presolve + matriz)
+- solve_s / objetivo / estado: resolver_version "A" sobre esa plantilla
+- propuestas_s: generar_propuestas_api completo (A/B/C) y sus fases
+- tamaño del modelo, memoria de sus arrays y pico de RSS del proceso
+Con --salida se guarda un JSON; con --comparar se contrasta con otro
+(p.ej. el de master) y se marcan regresiones: tiempos que empeoran más de
+--tolerancia (y de MIN_DELTA_S en absoluto), cambios de estado y de
+objetivo. Sale con código 1 si hay alguna.
+USO: python Benchmarks/bench_suite.py [--tamanos 1000 10000 100000]
+         [--presupuestos 30 60 120] [--perfiles estandar vegano ...]
+         [--salida actual.json] [--comparar base.json] [--tolerancia 0.25]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Backend"))
+
+import numpy as np
+
+from catalogo import CatalogoSnapshot
+from catalogo_sintetico import generar
+from models import PERFILES_DIETA
+from optimizer_logic import (PlantillaModelo, TIEMPO_MAX_S, generar_propuestas_api,
+                             obtener_backend, resolver_version)
+
+TAMANOS = [1000, 10000, 100000]
+PRESUPUESTOS = [30, 60, 120]
+# "personalizado" arranca con los mismos valores que "estandar"
+PERFILES = [p for p in PERFILES_DIETA if p != "personalizado"]
+TIEMPOS = ("construccion_s", "solve_s", "propuestas_s")
+MIN_DELTA_S = 0.05  # por debajo de esto es ruido aunque el % sea grande
+
+
+def _rss_pico_mb():
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _memoria_modelo_mb(plantilla):
+    """Bytes de los arrays NumPy de la plantilla (y de sus columnas de productos)."""
+    arrays = [v for v in vars(plantilla).values() if isinstance(v, np.ndarray)]
+    arrays += [v for v in vars(plantilla.cols).values() if isinstance(v, np.ndarray)]
+    return round(sum(a.nbytes for a in arrays) / 1e6, 2)
+
+
+def _caso(snapshot, plantilla, perfil, presupuesto):
+    cfg = PERFILES_DIETA[perfil]
+    excluir = cfg["excluir_tipos"] or None
+    prot_sem, kcal_sem = cfg["proteinas"] * 7, cfg["calorias"] * 7
+    carb_sem = cfg["carbohidratos"] * 7 if cfg["carbohidratos"] else None
+    gras_sem = cfg["grasas"] * 7 if cfg["grasas"] else None
+
+    t0 = time.perf_counter()
+    va = resolver_version(snapshot.vista(excluir), presupuesto, prot_sem, kcal_sem, carb_sem, gras_sem,
+                          version_name="A", plantilla=plantilla, limite_s=TIEMPO_MAX_S)
+    solve_s = time.perf_counter() - t0
+    resuelto = va.get("estado") in ("optimo", "factible")
+
+    t0 = time.perf_counter()
+    res = generar_propuestas_api(presupuesto, cfg["proteinas"], cfg["calorias"],
+                                 cfg["carbohidratos"], cfg["grasas"], excluir_tipos=excluir,
+                                 catalogo=snapshot)
+    propuestas_s = time.perf_counter() - t0
+    medidas = res.get("_metricas") or {}
+
+    return {
+        "solve_s": round(solve_s, 4),
+        "estado": va.get("estado", "error"),
+        "objetivo": round(float(plantilla.coste @ plantilla.x), 6) if resuelto else None,
+        "precio_total": va.get("precio_total"),
+        "propuestas_s": round(propuestas_s, 4),
+        "estados_abc": [res.get(f"version_{v}", {}).get("estado", "error") for v in "abc"],
+        "fases": {f: round(s, 4) for f, s in medidas.get("fases", {}).items()},
+        "versiones": {v: {f: round(s, 4) for f, s in fs.items()}
+                      for v, fs in medidas.get("versiones", {}).items()},
+    }
+
+
+def ejecutar(tamanos, perfiles, presupuestos):
+    casos = []
+    for n in tamanos:
+        t0 = time.perf_counter()
+        snapshot = CatalogoSnapshot(f"sintetico-{n}", generar(n))
+        print(f"\n=== {n} productos (catálogo en {time.perf_counter() - t0:.2f}s) ===")
+        for perfil in perfiles:
+            productos = snapshot.vista(PERFILES_DIETA[perfil]["excluir_tipos"])
+            t0 = time.perf_counter()
+            plantilla = PlantillaModelo(productos)
+            construccion_s = time.perf_counter() - t0
+            modelo = {"productos": len(productos), "variables": plantilla.n_columnas,
+                      "restricciones": len(plantilla.fila_lo), "nnz": len(plantilla.a_valor),
+                      "memoria_mb": _memoria_modelo_mb(plantilla)}
+            for presupuesto in presupuestos:
+                caso = {"tamano": n, "perfil": perfil, "presupuesto": presupuesto,
+                        "construccion_s": round(construccion_s, 4), "modelo": modelo}
+                caso.update(_caso(snapshot, plantilla, perfil, presupuesto))
+                caso["rss_pico_mb"] = _rss_pico_mb()
+                casos.append(caso)
+                print(f"[SUITE] {n:>6} {perfil:12s} {presupuesto:>4g}€ | build {construccion_s:6.2f}s | "
+                      f"solve A {caso['solve_s']:6.2f}s ({caso['estado']}) | A/B/C {caso['propuestas_s']:6.2f}s | "
+                      f"{modelo['variables']} vars, {modelo['memoria_mb']} MB | RSS {caso['rss_pico_mb']} MB")
+    return casos
+
+
+def _clave(caso):
+    return (caso["tamano"], caso["perfil"], caso["presupuesto"])
+
+
+def comparar(base, actual, tolerancia):
+    """Lista de regresiones (texto) de `actual` frente a `base`."""
+    previos = {_clave(c): c for c in base["casos"]}
+    regresiones = []
+    for caso in actual["casos"]:
+        previo = previos.get(_clave(caso))
+        if previo is None:
+            continue
+        nombre = "{} {} {:g}€".format(*_clave(caso))
+        for t in TIEMPOS:
+            antes, ahora = previo[t], caso[t]
+            if ahora - antes > MIN_DELTA_S and ahora > antes * (1 + tolerancia):
+                regresiones.append(f"{nombre}: {t} {antes:.3f}s -> {ahora:.3f}s (+{ahora / antes - 1:.0%})")
+        if previo["estado"] != caso["estado"]:
+            regresiones.append(f"{nombre}: estado {previo['estado']} -> {caso['estado']}")
+        elif (previo["estado"] == caso["estado"] == "optimo"
+              and abs(previo["objetivo"] - caso["objetivo"]) > 1e-6 * max(1.0, abs(previo["objetivo"]))):
+            regresiones.append(f"{nombre}: objetivo {previo['objetivo']} -> {caso['objetivo']}")
+    sin_pareja = len(actual["casos"]) - sum(_clave(c) in previos for c in actual["casos"])
+    if sin_pareja:
+        print(f"[SUITE] {sin_pareja} casos sin equivalente en la base (no se comparan)")
+    return regresiones
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suite de benchmarks del optimizador")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS)
+    parser.add_argument("--perfiles", nargs="+", default=PERFILES, choices=list(PERFILES_DIETA))
+    parser.add_argument("--presupuestos", type=float, nargs="+", default=PRESUPUESTOS)
+    parser.add_argument("--salida", help="JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior (línea base)")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="empeoramiento relativo de tiempos permitido (0.25 = +25%%)")
+    args = parser.parse_args()
+
+    actual = {
+        "meta": {"fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "maquina": platform.machine(), "cpus": os.cpu_count(),
+                 "backend": obtener_backend().nombre, "tiempo_max_s": TIEMPO_MAX_S},
+        "casos": ejecutar(args.tamanos, args.perfiles, args.presupuestos),
+    }
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(actual, f, indent=2, ensure_ascii=False)
+        print(f"\n[SUITE] {len(actual['casos'])} casos -> {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        regresiones = comparar(base, actual, args.tolerancia)
+        print(f"\n=== Comparación con {args.comparar} ({len(regresiones)} regresiones) ===")
+        for r in regresiones:
+            print(f"  ✗ {r}")
+        sys.exit(1 if regresiones else 0)
@@ -0,0 +1,61 @@
+"""
+Benchmark: regenerar una versión en frío vs con MIP start (cesta anterior).
+Simula el botón "regenerar sección" del dashboard: se resuelve la versión A,
+se fijan todas las secciones menos una y se vuelve a resolver solo A,
+primero sin pista y después sembrando la cesta anterior.
+USO: python Benchmarks/bench_warmstart.py [n_repeticiones]
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Backend"))
+
+import optimizer_logic
+from catalogo import cargar_productos
+from optimizer_logic import BACKENDS, SECCIONES, PlantillaModelo, highspy, resolver_version
+
+PRESUPUESTOS = [30, 50, 80]
+PROT_SEM = 150 * 7
+KCAL_SEM = 2400 * 7
+
+
+def _regenerar(productos, plantilla, presupuesto, cesta, seccion, cesta_previa):
+    fijas = {s: items for s, items in cesta["secciones"].items() if s != seccion}
+    t0 = time.perf_counter()
+    v = resolver_version(productos, presupuesto, PROT_SEM, KCAL_SEM, version_name="A",
+                         secciones_fijas=fijas, plantilla=plantilla, cesta_previa=cesta_previa)
+    return time.perf_counter() - t0, "error" not in v
+
+
+def bench(productos, repeticiones):
+    backends = [n for n in BACKENDS if n != "highs" or highspy is not None]
+    print(f"\n{'='*70}")
+    print(f"📊 Regenerar sección (solo_version + secciones_fijas) | {len(productos)} prods")
+    print(f"{'='*70}")
+    print(f"   {'backend':8s} {'frío (ms)':>10s} {'warm (ms)':>10s} {'ahorro':>8s}  solves")
+    for nombre in backends:
+        optimizer_logic.SOLVER_BACKEND = nombre  # backend que usa resolver_version
+        plantilla = PlantillaModelo(productos)
+        frio, warm, n = 0.0, 0.0, 0
+        for _ in range(repeticiones):
+            for presupuesto in PRESUPUESTOS:
+                cesta = resolver_version(productos, presupuesto, PROT_SEM, KCAL_SEM, plantilla=plantilla)
+                if "error" in cesta:
+                    continue
+                for seccion in SECCIONES:
+                    t_frio, ok_frio = _regenerar(productos, plantilla, presupuesto, cesta, seccion, None)
+                    t_warm, ok_warm = _regenerar(productos, plantilla, presupuesto, cesta, seccion,
+                                                 cesta["secciones"])
+                    if ok_frio and ok_warm:
+                        frio += t_frio
+                        warm += t_warm
+                        n += 1
+        if n:
+            print(f"   {nombre:8s} {frio / n * 1000:10.1f} {warm / n * 1000:10.1f} "
+                  f"{(1 - warm / frio) * 100:7.1f}%  {n}")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    bench(cargar_productos(), n)
@@ -0,0 +1,135 @@
+"""
+Catálogos sintéticos para benchmarks (sin BBDD).
+Parte de ETL/products_macro.csv (nombres, precios y pesos reales de
+Mercadona) y reproduce lo que haría el ETL:
+- tipo con el clasificador de Database/migrate_schema.py
+- momentos con las reglas de Database/clasificar_momentos.py
+- macros por 100 g sintéticas, con media y dispersión por tipo (el CSV no
+  trae nutrición: en producción llega de la API en load_products.py)
+- mismos filtros que QUERY_PRODUCTOS y EXCLUSION_RULES
+Para tamaños mayores que el CSV se replican productos (nombre único,
+precio ±20%, macros ±10%); para menores se muestrea respetando la mezcla
+de tipos. Mismo `semilla` → mismo catálogo.
+USO: python Benchmarks/catalogo_sintetico.py [n_productos] [destino .csv|.parquet|sqlite:///x.db]
+     (con destino se exporta para usarlo como CATALOGO_FUENTE)
+"""
+import csv
+import os
+import random
+import re
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(RAIZ, "Backend"))
+sys.path.append(os.path.join(RAIZ, "Database"))
+
+from catalogo import preparar_productos
+from fuentes_catalogo import TIPOS_FUERA, exportar
+from clasificar_momentos import clasificar_producto
+from migrate_schema import CLASIFICACION, clasificar_producto_v2
+
+CSV_PRODUCTOS = os.path.join(RAIZ, "ETL", "products_macro.csv")
+
+# Macros medias por 100 g (proteínas, carbohidratos, grasas) de cada tipo
+MACROS_TIPO = {
+    'carne':    (20.0, 1.0, 12.0),
+    'pescado':  (19.0, 1.0, 6.0),
+    'verdura':  (2.0, 6.0, 0.3),
+    'fruta':    (0.8, 12.0, 0.3),
+    'lacteo':   (6.0, 6.0, 5.0),
+    'legumbre': (8.0, 18.0, 1.5),
+    'cereal':   (9.0, 65.0, 4.0),
+    'huevo':    (12.5, 0.7, 10.0),
+    'capricho': (6.0, 55.0, 24.0),
+    'conserva': (15.0, 3.0, 9.0),
+}
+PESO_POR_DEFECTO = 250
+
+
+def _precio(texto):
+    try:
+        return float(texto.replace('€', '').replace(',', '.').strip())
+    except ValueError:
+        return 0.0
+
+
+def _peso(subtitulo):
+    """Mismo criterio que extract_weight del ETL (g/ml, kg/l)."""
+    m = re.search(r'(\d+(?:[\.,]\d+)?)\s*(g|kg|ml|l)\b', subtitulo.lower())
+    if not m:
+        return PESO_POR_DEFECTO
+    num = float(m.group(1).replace(',', '.'))
+    return num * 1000 if m.group(2) in ('kg', 'l') else num
+
+
+def _macros(tipo, rnd):
+    prot, carb, gras = (max(0.0, v * rnd.lognormvariate(0, 0.35)) for v in MACROS_TIPO[tipo])
+    # Topes de EXCLUSION_RULES (datos "corruptos" que el ETL descarta)
+    prot = min(prot, 50.0)
+    kcal = min(4 * prot + 4 * carb + 9 * gras, 740.0)
+    return prot, carb, gras, kcal
+
+
+def productos_base(semilla=0):
+    """Filas tipo QUERY_PRODUCTOS a partir del CSV (sin preparar)."""
+    rnd = random.Random(semilla)
+    filas, vistos = [], set()
+    with open(CSV_PRODUCTOS, encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            nombre = r['name'].strip()
+            tipo = clasificar_producto_v2(nombre)
+            precio = _precio(r['price'])
+            if tipo in TIPOS_FUERA or precio <= 0 or nombre in vistos:
+                continue
+            vistos.add(nombre)
+            prot, carb, gras, kcal = _macros(tipo, rnd)
+            filas.append({
+                'id': int(r['id']), 'nombre': nombre, 'precio': precio,
+                'peso_gramos': _peso(r['subtitle']), 'imagen_url': r['main_image_url'],
+                'tipo': tipo, 'emoji': CLASIFICACION[tipo]['emoji'],
+                'momentos': clasificar_producto(nombre, tipo),
+                'proteinas_100g': prot, 'carbohidratos_100g': carb,
+                'grasas_100g': gras, 'calorias_100g': kcal,
+            })
+    return filas
+
+
+def generar_filas(n, semilla=0):
+    """Exactamente n filas tipo QUERY_PRODUCTOS (sin preparar)."""
+    base = productos_base(semilla)
+    rnd = random.Random(semilla + 1)
+    if n <= len(base):
+        filas = [dict(p) for p in rnd.sample(base, n)]
+    else:
+        filas = [dict(p) for p in base]
+        copia = 1
+        while len(filas) < n:
+            for p in base:
+                if len(filas) >= n:
+                    break
+                q = dict(p)
+                q['id'] = p['id'] + copia * 1_000_000
+                q['nombre'] = f"{p['nombre']} #{copia}"
+                q['precio'] = round(p['precio'] * rnd.uniform(0.8, 1.2), 2)
+                for campo in ('proteinas_100g', 'carbohidratos_100g', 'grasas_100g', 'calorias_100g'):
+                    q[campo] = p[campo] * rnd.uniform(0.9, 1.1)
+                filas.append(q)
+            copia += 1
+    return filas
+
+
+def generar(n, semilla=0):
+    """Catálogo preparado (como cargar_productos) de exactamente n productos."""
+    return preparar_productos(generar_filas(n, semilla))
+
+
+if __name__ == "__main__":
+    from collections import Counter
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    filas = generar_filas(n)
+    if len(sys.argv) > 2:
+        exportar(filas, sys.argv[2])
+    productos = preparar_productos(filas)
+    print(f"{len(productos)} productos sintéticos")
+    for tipo, cuenta in Counter(p['tipo'] for p in productos).most_common():
+        print(f"   {tipo:10s} {cuenta:7d} ({cuenta / len(productos):.1%})")
@@ -5,7 +5,7 @@ import { Settings, LogOut, Sparkles, ChevronDown, X, Flame, Beef, Wheat, Droplet
 import { jsPDF } from 'jspdf';
 import toast from 'react-hot-toast';
 import { useAuth } from '../context/AuthContext';
-import { apiPost, apiPut, apiUpload, apiGet, avatarUrl } from '../api';
+import { apiPost, apiPut, apiUpload, apiGet, apiStream, avatarUrl } from '../api';
 import NutritionalDashboard from '../components/NutritionalDashboard';
 import s from './DashboardPage.module.css';
 
@@ -124,19 +124,31 @@ export default function DashboardPage() {
         const perfil = perfiles[user?.perfil_dieta || 'estandar'];
         const excluir = perfil?.excluir_tipos?.length ? perfil.excluir_tipos : null;
         try {
-            const data = await apiPost('/optimizar', {
+            // Cada versión se pinta en cuanto llega (A suele estar en ~1/3 del tiempo total)
+            let error = null;
+            let fin = false;
+            await apiStream('/optimizar/stream', {
                 presupuesto: parseFloat(presupuesto),
                 proteinas: parseFloat(proteinas),
                 calorias: parseFloat(calorias),
                 carbohidratos: parseFloat(carbohidratos) || null,
                 grasas: parseFloat(grasas) || null,
                 excluir_tipos: excluir,
+            }, (ev) => {
+                if (ev.evento === 'version') {
+                    const key = `version_${ev.version.toLowerCase()}`;
+                    setResults(prev => ({ ...(prev || { version_a: null, version_b: null, version_c: null }), [key]: ev.datos }));
+                } else if (ev.evento === 'fin') {
+                    fin = true;
+                    setResults(prev => ({ ...prev, sesion_id: ev.sesion_id }));
+                } else if (ev.evento === 'error') {
+                    error = ev.error;
+                }
             });
-            if (data.version_a && data.version_b && data.version_c) {
-                setResults(data);
+            if (fin) {
                 toast.success('¡Versiones generadas!');
             } else {
-                toast.error(data.error || 'Error generando opciones');
+                toast.error(error || 'Error generando opciones');
             }
         } catch (e) {
             toast.error('Error de conexión');
@@ -161,7 +173,10 @@ export default function DashboardPage() {
             grasas: parseFloat(grasas) || null,
             excluir_tipos: perfiles[user?.perfil_dieta || 'estandar']?.excluir_tipos || [],
             secciones_fijas: fixedSections,
-            solo_version: label.includes('A') ? 'A' : label.includes('B') ? 'B' : 'C'
+            solo_version: label.includes('A') ? 'A' : label.includes('B') ? 'B' : 'C',
+            // Cesta actual como punto de partida del solver (regenera más rápido)
+            cesta_previa: currentData.secciones,
+            sesion_id: results?.sesion_id,
         };
 
         setRegenerating(label);
@@ -169,7 +184,7 @@ export default function DashboardPage() {
             const versionKey = `version_${req.solo_version.toLowerCase()}`;
             const res = await apiPost('/optimizar', req);
             if (res[versionKey] && !res[versionKey].error) {
-                setResults(prev => ({ ...prev, [versionKey]: res[versionKey] }));
+                setResults(prev => ({ ...prev, [versionKey]: res[versionKey], sesion_id: res.sesion_id }));
                 toast.success(`${sectionToRegenerate.charAt(0).toUpperCase() + sectionToRegenerate.slice(1)} regenerado`);
             } else {
                 toast.error(res[versionKey]?.error || 'Error regenerando sección');
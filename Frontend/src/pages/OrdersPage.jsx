@@ -17,30 +17,58 @@ export default function OrdersPage() {
     const [orders, setOrders] = useState([]);
     const [loadingOrders, setLoadingOrders] = useState(true);
     const [expandedOrder, setExpandedOrder] = useState(null);
+    // El listado es paginado y solo trae el resumen; la cesta se pide al abrir cada pedido
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+    const [details, setDetails] = useState({});
 
     useEffect(() => {
         fetchOrders();
     }, []);
 
-    const fetchOrders = async () => {
-        setLoadingOrders(true);
+    const fetchOrders = async (cursor = null) => {
+        if (cursor) setLoadingMore(true); else setLoadingOrders(true);
         try {
-            const data = await apiGet('/pedidos');
+            const data = await apiGet(cursor ? `/pedidos?cursor=${encodeURIComponent(cursor)}` : '/pedidos');
             if (data.error) throw new Error(data.error);
-            setOrders(data);
+            setOrders(prev => cursor ? [...prev, ...data.pedidos] : data.pedidos);
+            setNextCursor(data.siguiente);
         } catch (e) {
             toast.error(e.message || 'Error al cargar pedidos');
         } finally {
             setLoadingOrders(false);
+            setLoadingMore(false);
         }
     };
 
-    const loadOrder = (order) => {
+    const fetchDetail = async (id) => {
+        if (details[id]) return details[id];
+        try {
+            const data = await apiGet(`/pedidos/${id}`);
+            setDetails(prev => ({ ...prev, [id]: data }));
+            return data;
+        } catch (e) {
+            toast.error(e.message || 'Error al cargar el pedido');
+            return null;
+        }
+    };
+
+    const toggleOrder = async (id) => {
+        if (expandedOrder === id) {
+            setExpandedOrder(null);
+            return;
+        }
+        if (await fetchDetail(id)) setExpandedOrder(id);
+    };
+
+    const loadOrder = async (order) => {
+        const detail = await fetchDetail(order.id);
+        if (!detail) return;
         // Save to session storage to pass back to Dashboard
         sessionStorage.setItem('mercadona_load_order', JSON.stringify({
-            precio_total: order.precio_total,
-            macros: order.macros_json || {},
-            secciones: order.secciones_json || {}
+            precio_total: detail.precio_total,
+            macros: detail.macros_json || {},
+            secciones: detail.secciones_json || {}
         }));
         navigate('/');
     };
@@ -78,7 +106,7 @@ export default function OrdersPage() {
                                     </div>
 
                                     <div className={s.orderActions}>
-                                        <button className={s.btnSecondary} onClick={() => setExpandedOrder(expandedOrder === o.id ? null : o.id)}>
+                                        <button className={s.btnSecondary} onClick={() => toggleOrder(o.id)}>
                                             {expandedOrder === o.id ? 'Ocultar Detalles' : 'Ver Detalles'}
                                         </button>
                                         <button className={s.btnAccent} onClick={() => loadOrder(o)} title="Cargar como Versión C">
@@ -86,9 +114,9 @@ export default function OrdersPage() {
                                         </button>
                                     </div>
 
-                                    {expandedOrder === o.id && (
+                                    {expandedOrder === o.id && details[o.id] && (
                                         <div className={s.orderDetails}>
-                                            {Object.entries(o.secciones_json).map(([sec, items]) => (
+                                            {Object.entries(details[o.id].secciones_json).map(([sec, items]) => (
                                                 items.length > 0 && (
                                                     <div key={sec} className={s.orderSection}>
                                                         <div className={s.sectionTitle}>
@@ -109,6 +137,11 @@ export default function OrdersPage() {
                                     )}
                                 </div>
                             ))}
+                            {nextCursor && (
+                                <button className={s.btnSecondary} onClick={() => fetchOrders(nextCursor)} disabled={loadingMore}>
+                                    {loadingMore ? 'Cargando...' : 'Cargar más pedidos'}
+                                </button>
+                            )}
                         </div>
                     )}
                 </div>
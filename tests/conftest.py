@@ -0,0 +1,10 @@
+"""
+Tests de las partes en Python puro del Backend (sin BBDD ni solver).
+Los catálogos salen de Benchmarks/catalogo_sintetico.py.
+"""
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(RAIZ, "Backend"))
+sys.path.append(os.path.join(RAIZ, "Benchmarks"))
@@ -0,0 +1,82 @@
+import pytest
+
+from buscador import IndiceBusqueda, plegar, trigramas
+from catalogo import compactar
+
+NOMBRES = [
+    ("Plátano de Canarias", "fruta"),
+    ("Batido de plátano", "bebida"),
+    ("Chips de plátano macho", "capricho"),
+    ("Plato combinado de pollo", "carne"),
+    ("Pan de molde integral", "cereal"),
+    ("Tomate frito", "conserva"),
+    ("Aceite de oliva virgen extra", "aceite"),
+    ("Sal marina", "condimento"),
+]
+
+
+@pytest.fixture(scope="module")
+def indice():
+    productos = compactar([{"id": i + 1, "nombre": nombre, "precio": 1.0 + i, "tipo": tipo, "emoji": "",
+                            "comidas": ["comida"], "prot_pack": 1, "kcal_pack": 100, "carb_pack": 10,
+                            "gras_pack": 1} for i, (nombre, tipo) in enumerate(NOMBRES)])
+    return IndiceBusqueda(productos)
+
+
+def _nombres(indice, q, **kwargs):
+    return [r["nombre"] for r in indice.resultados(indice.buscar(q, **kwargs))]
+
+
+def test_plegar_quita_tildes_y_normaliza_espacios():
+    assert plegar("  PLÁTANO   Pingüino ") == "platano pinguino"
+
+
+def test_trigramas_de_prefijo_sin_relleno_final():
+    assert "no " in trigramas("platano")
+    assert "no " not in trigramas("platano", prefijo=True)
+    assert "^pl" in trigramas("platano")
+
+
+def test_sin_tildes_encuentra_con_tildes(indice):
+    assert "Plátano de Canarias" in _nombres(indice, "platano")
+    assert "Plátano de Canarias" in _nombres(indice, "PLÁTANO")
+
+
+def test_a_media_palabra_como_el_ilike(indice):
+    assert set(_nombres(indice, "tano")) == {"Plátano de Canarias", "Batido de plátano",
+                                             "Chips de plátano macho"}
+    assert _nombres(indice, "lde") == ["Pan de molde integral"]
+
+
+def test_orden_empieza_palabra_contiene_parecido(indice):
+    nombres = _nombres(indice, "plat")
+    # Empieza por la consulta (el más corto primero) > una palabra empieza por ella
+    assert nombres[:2] == ["Plátano de Canarias", "Plato combinado de pollo"]
+    assert set(nombres[2:4]) == {"Batido de plátano", "Chips de plátano macho"}
+
+
+def test_tolera_erratas(indice):
+    nombres = _nombres(indice, "platamo")
+    assert nombres and nombres[0] == "Plátano de Canarias"
+
+
+def test_incluye_tipos_que_no_usa_el_optimizador(indice):
+    assert _nombres(indice, "aceite") == ["Aceite de oliva virgen extra"]
+    assert _nombres(indice, "sal") == ["Sal marina"]
+    assert _nombres(indice, "aceite", solo_catalogo=True) == []
+    assert "Batido de plátano" not in _nombres(indice, "tano", solo_catalogo=True)
+
+
+def test_limite_y_sin_resultados(indice):
+    assert len(_nombres(indice, "de", limite=2)) == 2
+    assert _nombres(indice, "zzz") == []
+    assert _nombres(indice, "  ") == []
+
+
+def test_contiene_igual_que_recorrer_los_nombres():
+    from catalogo_sintetico import generar
+
+    indice = IndiceBusqueda(generar(2000))
+    for consulta in ("de", "pa", "tano", "leche entera", "o-p", "zzz", "ñ"):
+        esperado = {f for f, nombre in enumerate(indice.plegados) if plegar(consulta) in nombre}
+        assert set(indice._contienen(plegar(consulta)).tolist()) == esperado
@@ -0,0 +1,67 @@
+from cache_resultados import clave_peticion, normalizar_peticion
+from models import DietaRequest
+
+
+def _peticion(**cambios):
+    datos = {"presupuesto": 57.3, "proteinas": 150, "calorias": 2400}
+    return DietaRequest(**{**datos, **cambios})
+
+
+def test_se_resuelve_con_los_valores_exactos():
+    kwargs = normalizar_peticion(_peticion(proteinas=149.5, carbohidratos=252.4))
+    assert kwargs["presupuesto_max"] == 57.3
+    assert kwargs["proteina_diaria"] == 149.5
+    assert kwargs["kcal_diaria"] == 2400
+    assert kwargs["carbohidratos_diarios"] == 252.4
+    assert kwargs["grasas_diarias"] is None
+
+
+def test_macros_a_cero_cuentan_como_sin_objetivo():
+    kwargs = normalizar_peticion(_peticion(carbohidratos=0, grasas=0))
+    assert kwargs["carbohidratos_diarios"] is None and kwargs["grasas_diarias"] is None
+
+
+def test_solo_version_sin_fijas_se_ignora():
+    kwargs = normalizar_peticion(_peticion(solo_version="b"))
+    assert kwargs["solo_version"] is None and kwargs["secciones_fijas"] is None
+    fijas = {"comida": [{"nombre": "Arroz"}]}
+    kwargs = normalizar_peticion(_peticion(solo_version="b", secciones_fijas=fijas))
+    assert kwargs["solo_version"] == "B" and kwargs["secciones_fijas"] == fijas
+
+
+def test_clave_ignora_el_orden_de_las_exclusiones():
+    a = normalizar_peticion(_peticion(excluir_tipos=["carne", "pescado"]))
+    b = normalizar_peticion(_peticion(excluir_tipos=["pescado", "carne", "carne"]))
+    assert clave_peticion(a, "v1") == clave_peticion(b, "v1")
+
+
+def test_clave_cuantiza_sin_salirse_de_la_peticion():
+    # Por debajo del céntimo: misma clave
+    assert clave_peticion(normalizar_peticion(_peticion(presupuesto=57.3)), "v1") == \
+        clave_peticion(normalizar_peticion(_peticion(presupuesto=57.304)), "v1")
+    # Un céntimo más ya es otra cesta posible
+    assert clave_peticion(normalizar_peticion(_peticion(presupuesto=57.3)), "v1") != \
+        clave_peticion(normalizar_peticion(_peticion(presupuesto=57.31)), "v1")
+    # 57.3 / 0.01 no debe caer a 57.29 por coma flotante
+    assert clave_peticion(normalizar_peticion(_peticion(presupuesto=57.3)), "v1") != \
+        clave_peticion(normalizar_peticion(_peticion(presupuesto=57.29)), "v1")
+
+
+def test_clave_depende_de_la_version_del_catalogo():
+    kwargs = normalizar_peticion(_peticion())
+    assert clave_peticion(kwargs, "v1") != clave_peticion(kwargs, "v2")
+
+
+def test_fijas_en_otro_orden_misma_clave_y_mismo_modelo():
+    from optimizer_logic import _parsear_fijas
+
+    sid_de = {"Arroz": 1, "Leche": 2}.get
+    a = {"cena": [{"nombre": "Arroz"}], "comida": [{"nombre": "Leche"}, {"nombre": "Arroz (x2)"}]}
+    b = {"comida": [{"nombre": "Arroz (x2)"}, {"nombre": "Leche"}], "cena": [{"nombre": "Arroz"}]}
+    kw_a = normalizar_peticion(_peticion(solo_version="A", secciones_fijas=a))
+    kw_b = normalizar_peticion(_peticion(solo_version="A", secciones_fijas=b))
+    assert clave_peticion(kw_a, "v1") == clave_peticion(kw_b, "v1")
+    fijas_a, fijas_b = _parsear_fijas(a, sid_de), _parsear_fijas(b, sid_de)
+    assert fijas_a == fijas_b == {1: {"comida": 2, "cena": 1}, 2: {"comida": 1}}
+    # parchear asigna el producto a su primera sección: tiene que ser la misma
+    assert list(fijas_a[1]) == list(fijas_b[1]) == ["comida", "cena"]
@@ -0,0 +1,56 @@
+import random
+import threading
+import time
+
+import pulp
+import pytest
+
+pytest.importorskip("psutil")
+
+from optimizer_logic import _CBCVigilado, _vigilar_cbc
+
+
+def _market_split(semilla):
+    """Market split (Cornuéjols-Dawande): pocas filas de igualdad y CBC tarda segundos en cerrarlo."""
+    rng = random.Random(semilla)
+    m, n = 4, 40
+    prob = pulp.LpProblem(f"split{semilla}", pulp.LpMinimize)
+    x = [pulp.LpVariable(f"x{j}", cat="Binary") for j in range(n)]
+    holguras = []
+    for i in range(m):
+        a = [rng.randint(0, 99) for _ in range(n)]
+        s_mas, s_menos = pulp.LpVariable(f"s{i}p", 0), pulp.LpVariable(f"s{i}m", 0)
+        holguras += [s_mas, s_menos]
+        prob += pulp.lpSum(c * v for c, v in zip(a, x)) + s_mas - s_menos == sum(a) // 2
+    prob += pulp.lpSum(holguras)
+    return prob
+
+
+def _resolver(prob, cancelada, limite_s, salida):
+    solver = _CBCVigilado(msg=0, timeLimit=limite_s)
+    t0 = time.perf_counter()
+    try:
+        with _vigilar_cbc(solver, cancelada=cancelada, intervalo_s=0.05):
+            prob.solve(solver)
+        salida["estado"] = pulp.LpStatus[prob.status]
+    except pulp.PulpSolverError:
+        salida["estado"] = "matado"
+    salida["segundos"] = time.perf_counter() - t0
+
+
+def test_cancelar_un_solve_no_mata_el_cbc_de_otro():
+    cancelar = threading.Event()
+    cancelado, vivo = {}, {}
+    hilos = [threading.Thread(target=_resolver, args=(_market_split(1), cancelar.is_set, 30, cancelado)),
+             threading.Thread(target=_resolver, args=(_market_split(2), lambda: False, 3, vivo))]
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(0.5)
+    cancelar.set()
+    for hilo in hilos:
+        hilo.join()
+    assert cancelado["estado"] == "matado"
+    assert cancelado["segundos"] < 2
+    # El otro CBC sigue hasta su límite de tiempo (o hasta el óptimo), no lo mata la cancelación ajena
+    assert vivo["estado"] != "matado"
+    assert vivo["segundos"] > 1
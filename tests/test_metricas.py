@@ -0,0 +1,42 @@
+from metricas import Histograma, MetricasOptimizador, juntar, server_timing
+
+
+def _valores(lineas):
+    """{'nombre{etiquetas}': valor} de las líneas de muestra (sin # HELP / # TYPE)."""
+    return dict(linea.rsplit(" ", 1) for linea in lineas if not linea.startswith("#"))
+
+
+def test_histograma_acumula_por_bucket():
+    h = Histograma("t_segundos", "ayuda", (0.1, 1, 10))
+    for valor in (0.05, 0.1, 0.5, 20):
+        h.observar(valor, endpoint="/x")
+    valores = _valores(h.exponer())
+    assert valores['t_segundos_bucket{endpoint="/x",le="0.1"}'] == "2"  # le incluye el límite
+    assert valores['t_segundos_bucket{endpoint="/x",le="1"}'] == "3"
+    assert valores['t_segundos_bucket{endpoint="/x",le="10"}'] == "3"
+    assert valores['t_segundos_bucket{endpoint="/x",le="+Inf"}'] == "4"
+    assert valores['t_segundos_count{endpoint="/x"}'] == "4"
+    assert float(valores['t_segundos_sum{endpoint="/x"}']) == 20.65
+
+
+def test_histograma_una_serie_por_etiquetas():
+    h = Histograma("t", "ayuda", (1,))
+    h.observar(0.5, origen="cache", endpoint="/a")
+    h.observar(0.5, endpoint="/a", origen="cache")  # mismo orden canónico
+    h.observar(0.5, endpoint="/a", origen="solver")
+    valores = _valores(h.exponer())
+    assert valores['t_count{endpoint="/a",origen="cache"}'] == "2"
+    assert valores['t_count{endpoint="/a",origen="solver"}'] == "1"
+
+
+def test_exponer_con_extra_y_server_timing():
+    m = MetricasOptimizador()
+    medidas = juntar([{"total": 0.2, "fases": {"catalogo": 0.01}, "versiones": {"A": {"solve": 0.15}},
+                       "modelo": {"variables": 1200}, "cola": 0.02}, None])
+    m.registrar("/optimizar", "solver", 0.25, medidas)
+    texto = m.exponer(extra={"optimizer_x_total": ("ayuda", "counter", 7)})
+    assert 'optimizer_fase_segundos_count{fase="solve",version="A"} 1' in texto
+    assert 'optimizer_modelo_ultimo{dimension="variables"} 1200' in texto
+    assert "# TYPE optimizer_x_total counter\noptimizer_x_total 7\n" in texto
+    assert server_timing(0.25, "solver", medidas) == \
+        'origen;desc="solver", catalogo;dur=10.0, solve-a;dur=150.0, cola;dur=20.0, total;dur=250.0'
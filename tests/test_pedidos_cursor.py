@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from main import _cursor_pedidos, _leer_cursor_pedidos
+
+
+def test_cursor_ida_y_vuelta():
+    fecha = datetime(2025, 3, 9, 18, 30, 12, 345678, tzinfo=timezone.utc)
+    assert _leer_cursor_pedidos(_cursor_pedidos(fecha, 4217)) == (fecha, 4217)
+
+
+def test_cursor_sin_zona_horaria():
+    fecha = datetime(2025, 1, 1)
+    assert _leer_cursor_pedidos(_cursor_pedidos(fecha, 1)) == (fecha, 1)
+
+
+@pytest.mark.parametrize("cursor", ["", "basura", "bm8tZmVjaGF8MQ==", "MjAyNS0wMS0wMXxhYmM=", "MjAyNS0wMS0wMQ=="])
+def test_cursor_no_valido_da_400(cursor):
+    # basura, "no-fecha|1", "2025-01-01|abc" y "2025-01-01" (sin id)
+    with pytest.raises(HTTPException) as error:
+        _leer_cursor_pedidos(cursor)
+    assert error.value.status_code == 400
@@ -0,0 +1,39 @@
+import pytest
+
+from catalogo_sintetico import generar
+from optimizer_logic import PlantillaModelo, comprobar_cotas, comprobar_relajacion, diagnosticar
+
+
+@pytest.fixture(scope="module")
+def plantilla():
+    return PlantillaModelo(generar(1500))
+
+
+def _parchear(plantilla, presupuesto, prot, kcal):
+    plantilla.parchear(presupuesto, prot * 7, kcal * 7)
+    return plantilla
+
+
+def test_peticion_normal_pasa_las_cotas(plantilla):
+    assert comprobar_cotas(_parchear(plantilla, 80, 150, 2400)) is None
+
+
+def test_cotas_nombran_la_restriccion_que_choca(plantilla):
+    motivo = comprobar_cotas(_parchear(plantilla, 5, 150, 2400))
+    assert motivo["restriccion"] == "Prot"
+    assert "5.00€" in motivo["mensaje"]
+
+
+def test_relajacion_pasa_si_es_viable(plantilla):
+    pytest.importorskip("highspy")
+    assert comprobar_relajacion(_parchear(plantilla, 80, 150, 2400)) is None
+
+
+def test_relajacion_coge_lo_que_las_cotas_dejan_pasar(plantilla):
+    pytest.importorskip("highspy")
+    _parchear(plantilla, 30, 600, 2400)
+    assert comprobar_cotas(plantilla) is None
+    motivo = comprobar_relajacion(plantilla)
+    assert motivo["restriccion"] == "Prot"
+    assert motivo["mensaje"].startswith("ni relajando la integralidad")
+    assert diagnosticar(plantilla) == motivo
@@ -0,0 +1,27 @@
+import numpy as np
+
+import optimizer_logic
+from catalogo_sintetico import generar
+from optimizer_logic import ColumnasProductos, presolve_estatico
+
+
+def _columnas(n=3000):
+    return ColumnasProductos(generar(n))
+
+
+def test_por_defecto_solo_poda_lo_exacto():
+    cols = _columnas()
+    quedan, stats = presolve_estatico(cols)
+    assert stats["dominados"] == 0
+    assert stats["sin_seccion"] == int((cols.secciones.sum(axis=1) == 0).sum())
+    assert int((~quedan).sum()) == stats["sin_seccion"]
+
+
+def test_dominancia_heuristica_respeta_los_fijados(monkeypatch):
+    monkeypatch.setattr(optimizer_logic, "PRESOLVE_DOMINANCIA", True)
+    cols = _columnas()
+    quedan, stats = presolve_estatico(cols)
+    assert stats["dominados"] > 0
+    fijados = cols.sid[~quedan & (cols.secciones.sum(axis=1) > 0)][:5]
+    quedan, _ = presolve_estatico(cols, incluir=fijados.tolist())
+    assert quedan[np.isin(cols.sid, fijados)].all()